@@ -15,6 +15,9 @@ class Config:
     # MongoDB configuration
     MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
     DATABASE_NAME = os.getenv("DATABASE_NAME", "telegram_bot")
+    MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "5"))
+    MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "20"))
+    MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000"))
     
     # File handling
     MAX_FILE_SIZE = 5 * 1024 * 1024 * 1024  # 5GB in bytes
@@ -31,6 +34,7 @@ class Config:
     # Premium features
     PREMIUM_ENABLED = os.getenv("PREMIUM_ENABLED", "false").lower() == "true"
     REFERRAL_BONUS = int(os.getenv("REFERRAL_BONUS", "30"))  # Days
+    REFERRAL_SECRET = os.getenv("REFERRAL_SECRET", BOT_TOKEN)  # Keys derived referral codes
     
     # Logging
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
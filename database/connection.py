@@ -3,10 +3,14 @@ Database connection and operations
 """
 
 import asyncio
+import json
 import logging
+import time
+from dataclasses import MISSING, fields
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
 from pymongo.errors import ConnectionFailure, DuplicateKeyError
 
 from config import Config
@@ -14,6 +18,28 @@ from database.models import User, UserSettings, FileRecord, Thumbnail, BotStats,
 
 logger = logging.getLogger(__name__)
 
+# Seconds a user's settings are served from memory before being re-read
+SETTINGS_CACHE_TTL = 30
+SETTINGS_CACHE_MAX_SIZE = 10000
+
+# Seconds a user document is served from memory before being re-read
+USER_CACHE_TTL = 600
+USER_CACHE_MAX_SIZE = 10000
+
+# Maximum cache age for lookups that gate access on ban or premium status, so
+# changes written by another process or directly to MongoDB apply quickly
+USER_ACCESS_CACHE_TTL = 5
+
+# Seconds a user's thumbnail list is served from memory before being re-read
+THUMBNAILS_CACHE_TTL = 60
+THUMBNAILS_CACHE_MAX_SIZE = 10000
+
+# Model defaults for settings fields, used when a stored document predates a field
+_USER_SETTINGS_DEFAULTS = {f.name: f.default for f in fields(UserSettings) if f.default is not MISSING}
+
+# Seconds the active force-subscription channel list is served from memory
+FORCE_SUB_CHANNELS_CACHE_TTL = 300
+
 class Database:
     """Database connection and operations manager"""
     
@@ -21,11 +47,41 @@ class Database:
         self.client: Optional[AsyncIOMotorClient] = None
         self.db = None
         self.connected = False
+        
+        # user_id -> (loaded_at, settings); entries are dropped on every settings write
+        self._settings_cache: Dict[int, Tuple[float, UserSettings]] = {}
+        
+        # user_id -> (loaded_at, user); entries are dropped on every user write
+        self._user_cache: Dict[int, Tuple[float, User]] = {}
+        
+        # user_id -> running get_user query, shared by concurrent callers
+        self._user_inflight: Dict[int, asyncio.Task] = {}
+        
+        # user_id -> (loaded_at, thumbnails); dropped when a thumbnail is created or deleted
+        self._thumbnails_cache: Dict[int, Tuple[float, List[Thumbnail]]] = {}
+        
+        # (loaded_at, channels); dropped whenever a channel is added or removed
+        self._force_sub_channels_cache: Optional[Tuple[float, List[ForceSubChannel]]] = None
+    
+    @staticmethod
+    def _cache_put(cache: Dict[int, Tuple[float, Any]], key: int, value: Any, max_size: int):
+        """Store a value in one of the in-memory caches, evicting the oldest entry when full"""
+        # Re-insert so the dict stays ordered oldest-first, then trim
+        cache.pop(key, None)
+        if len(cache) >= max_size:
+            cache.pop(next(iter(cache)))
+        cache[key] = (time.time(), value)
     
     async def connect(self):
         """Connect to MongoDB"""
         try:
-            self.client = AsyncIOMotorClient(Config.MONGODB_URI)
+            # One pooled client is shared by every query; keep a few warm connections
+            self.client = AsyncIOMotorClient(
+                Config.MONGODB_URI,
+                minPoolSize=Config.MONGODB_MIN_POOL_SIZE,
+                maxPoolSize=Config.MONGODB_MAX_POOL_SIZE,
+                maxIdleTimeMS=Config.MONGODB_MAX_IDLE_TIME_MS
+            )
             self.db = self.client[Config.DATABASE_NAME]
             
             # Test connection
@@ -34,6 +90,9 @@ class Database:
             # Create indexes
             await self.create_indexes()
             
+            # Migrate legacy data
+            await self.migrate_replace_rules()
+            
             self.connected = True
             logger.info("Connected to MongoDB successfully")
             
@@ -77,20 +136,81 @@ class Database:
         except Exception as e:
             logger.error(f"Error creating indexes: {e}")
     
+    async def migrate_replace_rules(self):
+        """Convert replace rules stored as a JSON string into an array of rule documents"""
+        try:
+            migrated = 0
+            cursor = self.db.user_settings.find(
+                {"replace_rules": {"$type": "string"}},
+                {"user_id": 1, "replace_rules": 1}
+            )
+            async for settings_data in cursor:
+                try:
+                    rules = json.loads(settings_data["replace_rules"])
+                except ValueError:
+                    rules = []
+                
+                await self.db.user_settings.update_one(
+                    {"_id": settings_data["_id"]},
+                    {"$set": {"replace_rules": rules}}
+                )
+                migrated += 1
+            
+            if migrated:
+                logger.info(f"Migrated replace rules for {migrated} users")
+                
+        except Exception as e:
+            logger.error(f"Error migrating replace rules: {e}")
+    
     # User operations
-    async def get_user(self, user_id: int) -> Optional[User]:
-        """Get user by ID"""
+    async def get_user(self, user_id: int, max_age: float = USER_CACHE_TTL) -> Optional[User]:
+        """Get user by ID, served from memory if cached less than max_age seconds ago
+        
+        Concurrent lookups of the same uncached user share one query. Callers
+        deciding access (bans, premium) pass max_age=USER_ACCESS_CACHE_TTL.
+        """
+        cached = self._user_cache.get(user_id)
+        if cached and time.time() - cached[0] < max_age:
+            return cached[1]
+        
+        task = self._user_inflight.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(self._load_user(user_id))
+            self._user_inflight[user_id] = task
+        
+        # Shield so one cancelled caller doesn't cancel the lookup for the others
+        return await asyncio.shield(task)
+    
+    async def _load_user(self, user_id: int) -> Optional[User]:
+        """Read a user from MongoDB for get_user and cache the result"""
+        current = asyncio.current_task()
         try:
             user_data = await self.db.users.find_one({"user_id": user_id})
-            return User.from_dict(user_data) if user_data else None
+            if not user_data:
+                return None
+            
+            user = User.from_dict(user_data)
+            # A write during the read invalidates this lookup; don't cache what it saw
+            if self._user_inflight.get(user_id) is current:
+                self._cache_put(self._user_cache, user_id, user, USER_CACHE_MAX_SIZE)
+            return user
         except Exception as e:
             logger.error(f"Error getting user {user_id}: {e}")
             return None
+        finally:
+            if self._user_inflight.get(user_id) is current:
+                del self._user_inflight[user_id]
+    
+    def _invalidate_user(self, user_id: int):
+        """Forget a user's cached document and any lookup already in flight"""
+        self._user_cache.pop(user_id, None)
+        self._user_inflight.pop(user_id, None)
     
     async def create_user(self, user: User) -> bool:
         """Create a new user"""
         try:
             await self.db.users.insert_one(user.to_dict())
+            self._invalidate_user(user.user_id)
             logger.info(f"Created user {user.user_id}")
             return True
         except DuplicateKeyError:
@@ -107,11 +227,32 @@ class Database:
                 {"user_id": user_id},
                 {"$set": {**updates, "last_activity": datetime.now()}}
             )
+            self._invalidate_user(user_id)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Error updating user {user_id}: {e}")
             return False
     
+    async def upsert_user_on_start(self, user_id: int, profile_fields: Dict[str, Any], on_insert_fields: Dict[str, Any]) -> bool:
+        """Refresh a user's profile, creating the user if needed, in one round trip
+        
+        Returns True if the user was newly created.
+        """
+        try:
+            result = await self.db.users.update_one(
+                {"user_id": user_id},
+                {
+                    "$set": {**profile_fields, "last_activity": datetime.now()},
+                    "$setOnInsert": on_insert_fields
+                },
+                upsert=True
+            )
+            self._invalidate_user(user_id)
+            return result.upserted_id is not None
+        except Exception as e:
+            logger.error(f"Error upserting user {user_id}: {e}")
+            return False
+    
     async def get_user_by_referral_code(self, referral_code: str) -> Optional[User]:
         """Get user by referral code"""
         try:
@@ -123,23 +264,53 @@ class Database:
     
     # User settings operations
     async def get_user_settings(self, user_id: int) -> Optional[UserSettings]:
-        """Get user settings"""
+        """Get user settings, served from memory for SETTINGS_CACHE_TTL seconds"""
+        cached = self._settings_cache.get(user_id)
+        if cached and time.time() - cached[0] < SETTINGS_CACHE_TTL:
+            return cached[1]
+        
         try:
             settings_data = await self.db.user_settings.find_one({"user_id": user_id})
-            return UserSettings.from_dict(settings_data) if settings_data else None
+            if not settings_data:
+                return None
+            
+            settings = UserSettings.from_dict(settings_data)
+            self._cache_put(self._settings_cache, user_id, settings, SETTINGS_CACHE_MAX_SIZE)
+            return settings
         except Exception as e:
             logger.error(f"Error getting user settings {user_id}: {e}")
             return None
     
+    async def get_rename_template(self, user_id: int) -> str:
+        """Get just the user's rename template"""
+        settings = await self.get_user_settings(user_id)
+        return settings.rename_template if settings else "{title}"
+    
     async def create_user_settings(self, settings: UserSettings) -> bool:
         """Create user settings"""
         try:
             await self.db.user_settings.insert_one(settings.to_dict())
+            self._settings_cache.pop(settings.user_id, None)
             return True
         except Exception as e:
             logger.error(f"Error creating user settings: {e}")
             return False
     
+    async def ensure_user_settings(self, user_id: int) -> bool:
+        """Create default settings for a user unless they already exist"""
+        try:
+            result = await self.db.user_settings.update_one(
+                {"user_id": user_id},
+                {"$setOnInsert": UserSettings(user_id=user_id).to_dict()},
+                upsert=True
+            )
+            if result.upserted_id is not None:
+                self._settings_cache.pop(user_id, None)
+            return True
+        except Exception as e:
+            logger.error(f"Error ensuring user settings {user_id}: {e}")
+            return False
+    
     async def update_user_settings(self, user_id: int, updates: Dict[str, Any]) -> bool:
         """Update user settings"""
         try:
@@ -148,11 +319,73 @@ class Database:
                 {"$set": {**updates, "updated_at": datetime.now()}},
                 upsert=True
             )
+            self._settings_cache.pop(user_id, None)
             return result.upserted_id is not None or result.modified_count > 0
         except Exception as e:
             logger.error(f"Error updating user settings {user_id}: {e}")
             return False
     
+    async def toggle_user_setting(self, user_id: int, field: str) -> Optional[UserSettings]:
+        """Flip a boolean setting in a single atomic update and return the new settings"""
+        # A missing field flips from its model default, not from null
+        current = {"$ifNull": [f"${field}", _USER_SETTINGS_DEFAULTS.get(field, False)]}
+        try:
+            for _ in range(2):
+                settings_data = await self.db.user_settings.find_one_and_update(
+                    {"user_id": user_id},
+                    [{"$set": {field: {"$not": [current]}, "updated_at": datetime.now()}}],
+                    return_document=ReturnDocument.AFTER
+                )
+                if settings_data:
+                    self._settings_cache.pop(user_id, None)
+                    return UserSettings.from_dict(settings_data)
+                
+                # No settings yet: create the defaults so the toggle flips the real default value
+                await self.create_user_settings(UserSettings(user_id=user_id))
+            return None
+        except Exception as e:
+            logger.error(f"Error toggling user setting {field} for {user_id}: {e}")
+            return None
+    
+    async def apply_replace_rule_ops(self, user_id: int, operations: List[Dict[str, Any]]) -> bool:
+        """Apply single-rule changes to a user's replace rules in one round trip
+        
+        Rules are identified by their 'old' text. Supported operations, applied in order:
+            {"op": "add", "rule": {...}}
+            {"op": "delete", "old": str}
+            {"op": "set_enabled", "old": str, "enabled": bool}
+        """
+        try:
+            now = datetime.now()
+            requests = []
+            
+            for operation in operations:
+                if operation["op"] == "add":
+                    requests.append(UpdateOne(
+                        {"user_id": user_id},
+                        {"$push": {"replace_rules": operation["rule"]}, "$set": {"updated_at": now}},
+                        upsert=True
+                    ))
+                elif operation["op"] == "delete":
+                    requests.append(UpdateOne(
+                        {"user_id": user_id},
+                        {"$pull": {"replace_rules": {"old": operation["old"]}}, "$set": {"updated_at": now}}
+                    ))
+                elif operation["op"] == "set_enabled":
+                    requests.append(UpdateOne(
+                        {"user_id": user_id},
+                        {"$set": {"replace_rules.$[rule].enabled": operation["enabled"], "updated_at": now}},
+                        array_filters=[{"rule.old": operation["old"]}]
+                    ))
+            
+            if requests:
+                await self.db.user_settings.bulk_write(requests, ordered=True)
+                self._settings_cache.pop(user_id, None)
+            return True
+        except Exception as e:
+            logger.error(f"Error applying replace rule operations {user_id}: {e}")
+            return False
+    
     # File record operations
     async def create_file_record(self, file_record: FileRecord) -> bool:
         """Create a file processing record"""
@@ -187,28 +420,75 @@ class Database:
             logger.error(f"Error getting user file records: {e}")
             return []
     
+    async def get_user_file_stats(self, user_id: int) -> Dict[str, int]:
+        """Get a user's file processing counts and total size in one aggregation"""
+        stats = {"total": 0, "completed": 0, "failed": 0, "total_size": 0, "week": 0, "month": 0}
+        try:
+            now = datetime.now()
+            
+            def count_if(condition):
+                return {"$sum": {"$cond": [condition, 1, 0]}}
+            
+            # Matches "(now - created_at).days <= N", i.e. less than N + 1 whole days old
+            pipeline = [
+                {"$match": {"user_id": user_id}},
+                {"$group": {
+                    "_id": None,
+                    "total": {"$sum": 1},
+                    "completed": count_if({"$eq": ["$processing_status", "completed"]}),
+                    "failed": count_if({"$eq": ["$processing_status", "failed"]}),
+                    "total_size": {"$sum": "$file_size"},
+                    "week": count_if({"$gt": ["$created_at", now - timedelta(days=8)]}),
+                    "month": count_if({"$gt": ["$created_at", now - timedelta(days=31)]})
+                }}
+            ]
+            async for result in self.db.file_records.aggregate(pipeline):
+                stats.update({key: result[key] for key in stats})
+            return stats
+        except Exception as e:
+            logger.error(f"Error getting user file stats: {e}")
+            return stats
+    
     # Thumbnail operations
     async def create_thumbnail(self, thumbnail: Thumbnail) -> bool:
         """Create a thumbnail record"""
         try:
             await self.db.thumbnails.insert_one(thumbnail.to_dict())
+            self._thumbnails_cache.pop(thumbnail.user_id, None)
             return True
         except Exception as e:
             logger.error(f"Error creating thumbnail: {e}")
             return False
     
     async def get_user_thumbnails(self, user_id: int) -> List[Thumbnail]:
-        """Get user's thumbnails"""
+        """Get user's thumbnails, served from memory for THUMBNAILS_CACHE_TTL seconds"""
+        cached = self._thumbnails_cache.get(user_id)
+        if cached and time.time() - cached[0] < THUMBNAILS_CACHE_TTL:
+            return cached[1]
+        
         try:
             cursor = self.db.thumbnails.find({"user_id": user_id}).sort("created_at", -1)
             thumbnails = []
             async for thumb_data in cursor:
                 thumbnails.append(Thumbnail.from_dict(thumb_data))
+            self._cache_put(self._thumbnails_cache, user_id, thumbnails, THUMBNAILS_CACHE_MAX_SIZE)
             return thumbnails
         except Exception as e:
             logger.error(f"Error getting user thumbnails: {e}")
             return []
     
+    async def get_thumbnail(self, thumbnail_id: str, user_id: int) -> Optional[Thumbnail]:
+        """Get a single thumbnail owned by the user"""
+        try:
+            thumb_data = await self.db.thumbnails.find_one({
+                "thumbnail_id": thumbnail_id,
+                "user_id": user_id
+            })
+            return Thumbnail.from_dict(thumb_data) if thumb_data else None
+        except Exception as e:
+            logger.error(f"Error getting thumbnail: {e}")
+            return None
+    
     async def delete_thumbnail(self, thumbnail_id: str, user_id: int) -> bool:
         """Delete a thumbnail"""
         try:
@@ -216,6 +496,7 @@ class Database:
                 "thumbnail_id": thumbnail_id,
                 "user_id": user_id
             })
+            self._thumbnails_cache.pop(user_id, None)
             return result.deleted_count > 0
         except Exception as e:
             logger.error(f"Error deleting thumbnail: {e}")
@@ -223,12 +504,17 @@ class Database:
     
     # Force subscription channels
     async def get_force_sub_channels(self) -> List[ForceSubChannel]:
-        """Get all active force subscription channels"""
+        """Get all active force subscription channels, served from memory for FORCE_SUB_CHANNELS_CACHE_TTL seconds"""
+        cached = self._force_sub_channels_cache
+        if cached and time.time() - cached[0] < FORCE_SUB_CHANNELS_CACHE_TTL:
+            return cached[1]
+        
         try:
             cursor = self.db.force_sub_channels.find({"is_active": True})
             channels = []
             async for channel_data in cursor:
                 channels.append(ForceSubChannel.from_dict(channel_data))
+            self._force_sub_channels_cache = (time.time(), channels)
             return channels
         except Exception as e:
             logger.error(f"Error getting force sub channels: {e}")
@@ -238,6 +524,7 @@ class Database:
         """Add a force subscription channel"""
         try:
             await self.db.force_sub_channels.insert_one(channel.to_dict())
+            self._force_sub_channels_cache = None
             return True
         except Exception as e:
             logger.error(f"Error adding force sub channel: {e}")
@@ -247,6 +534,7 @@ class Database:
         """Remove a force subscription channel"""
         try:
             result = await self.db.force_sub_channels.delete_one({"channel_id": channel_id})
+            self._force_sub_channels_cache = None
             return result.deleted_count > 0
         except Exception as e:
             logger.error(f"Error removing force sub channel: {e}")
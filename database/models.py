@@ -5,6 +5,7 @@ Database models for the Telegram bot
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from dataclasses import dataclass, field
+from functools import cached_property
 
 @dataclass
 class User:
@@ -151,6 +152,16 @@ class Thumbnail:
     def from_dict(cls, data: Dict[str, Any]) -> 'Thumbnail':
         """Create thumbnail from dictionary"""
         return cls(**data)
+    
+    @cached_property
+    def created_at_str(self) -> str:
+        """Creation date for list views, formatted once per loaded thumbnail"""
+        return self.created_at.strftime('%Y-%m-%d')
+    
+    @cached_property
+    def created_at_full(self) -> str:
+        """Creation date and time for the details view, formatted once per loaded thumbnail"""
+        return self.created_at.strftime('%Y-%m-%d %H:%M:%S')
 
 @dataclass
 class BotStats:
@@ -203,3 +214,10 @@ class ForceSubChannel:
     def from_dict(cls, data: Dict[str, Any]) -> 'ForceSubChannel':
         """Create channel from dictionary"""
         return cls(**data)
+    
+    @cached_property
+    def join_url(self) -> str:
+        """Public t.me link for the channel, computed once per loaded channel"""
+        if self.channel_username:
+            return f"https://t.me/{self.channel_username.lstrip('@')}"
+        return f"https://t.me/c/{self.channel_id.removeprefix('-100')}"
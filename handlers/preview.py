@@ -2,21 +2,187 @@
 Preview functionality for file renaming
 """
 
+import asyncio
+import functools
 import logging
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 import re
 from database.connection import db
 from utils.template_parser import TemplateParser
 # from utils.helpers import extract_file_info # corrected: function added to helpers, so no need to import here
-from handlers.replace import get_user_replace_rules, apply_replace_rules
+from handlers.replace import get_user_replace_rules, apply_replace_rules, is_replace_mode_enabled
 from handlers.mode import get_user_rename_mode
 from middleware.auth import require_auth
 from middleware.subscription_check import subscription_required
 from datetime import datetime
+from typing import AsyncIterator
 
 logger = logging.getLogger(__name__)
 
+_CATEGORY_PREFIX = "preview_category_"
+
+# Number of renamed entries emitted per chunk by generate_preview_report
+_REPORT_BATCH_SIZE = 50
+
+# Minimum interval between live preview edits for the same user (seconds)
+_LIVE_PREVIEW_DEBOUNCE = 0.3
+
+# Sample filenames used by the preview screens
+_SAMPLE_FILES = (
+    ("TV Shows", (
+        "Game.of.Thrones.S01E01.1080p.BluRay.x264-GROUP.mkv",
+        "Breaking.Bad.S05E14.720p.HDTV.x264-IMMERSE.mp4",
+        "The.Office.US.S02E10.WEB-DL.1080p.H264.mp4"
+    )),
+    ("Movies", (
+        "The.Dark.Knight.2008.1080p.BluRay.x264-SPARKS.mkv",
+        "Inception.2010.720p.BRRip.x264-YIFY.mp4",
+        "Avengers.Endgame.2019.4K.UHD.BluRay.x265-TERMINAL.mkv"
+    )),
+    ("Documents", (
+        "Important.Document.2024.pdf",
+        "Meeting.Notes.Jan.15.2024.docx",
+        "Project.Report.Final.Version.pdf"
+    )),
+    ("Audio", (
+        "Artist.Name.Song.Title.320kbps.mp3",
+        "Album.Name.Track.01.Artist.Name.flac",
+        "Podcast.Episode.123.Audio.Quality.mp3"
+    ))
+)
+
+_CATEGORY_FILES = {
+    "tv": (
+        "Game.of.Thrones.S01E01.1080p.BluRay.x264-GROUP.mkv",
+        "Breaking.Bad.S05E14.720p.HDTV.x264-IMMERSE.mp4",
+        "The.Office.US.S02E10.WEB-DL.1080p.H264.mp4",
+        "Stranger.Things.S04E01.2160p.NF.WEB-DL.x265-NTb.mkv",
+        "Friends.S01E01.720p.BluRay.x264-PSYCHD.mkv"
+    ),
+    "movies": (
+        "The.Dark.Knight.2008.1080p.BluRay.x264-SPARKS.mkv",
+        "Inception.2010.720p.BRRip.x264-YIFY.mp4",
+        "Avengers.Endgame.2019.4K.UHD.BluRay.x265-TERMINAL.mkv",
+        "Pulp.Fiction.1994.1080p.BluRay.x264-AMIABLE.mkv",
+        "The.Matrix.1999.2160p.UHD.BluRay.x265-SCOTCH.mkv"
+    ),
+    "docs": (
+        "Important.Document.2024.pdf",
+        "Meeting.Notes.Jan.15.2024.docx",
+        "Project.Report.Final.Version.pdf",
+        "User.Manual.Version.2.1.pdf",
+        "Presentation.Slides.Marketing.pptx"
+    ),
+    "audio": (
+        "Artist.Name.Song.Title.320kbps.mp3",
+        "Album.Name.Track.01.Artist.Name.flac",
+        "Podcast.Episode.123.Audio.Quality.mp3",
+        "Classical.Music.Symphony.No.5.wav",
+        "Electronic.Dance.Music.Mix.2024.mp3"
+    )
+}
+
+_CATEGORY_NAMES = {
+    "tv": "📺 TV Shows",
+    "movies": "🎬 Movies",
+    "docs": "📄 Documents",
+    "audio": "🎵 Audio Files"
+}
+
+# Static keyboards, built once at import time and shared by every call
+_PREVIEW_MAIN_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📝 Sample Files", callback_data="preview_samples")],
+    [InlineKeyboardButton("✏️ Custom Test", callback_data="preview_custom")],
+    [InlineKeyboardButton("📊 Batch Preview", callback_data="preview_batch")],
+    [InlineKeyboardButton("🔄 Live Preview", callback_data="preview_live")],
+    [InlineKeyboardButton("🏠 Back", callback_data="settings_main")]
+])
+
+_PREVIEW_SAMPLES_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📺 TV Shows", callback_data="preview_category_tv")],
+    [InlineKeyboardButton("🎬 Movies", callback_data="preview_category_movies")],
+    [InlineKeyboardButton("📄 Documents", callback_data="preview_category_docs")],
+    [InlineKeyboardButton("🎵 Audio", callback_data="preview_category_audio")],
+    [InlineKeyboardButton("🔙 Back", callback_data="preview_main")]
+])
+
+_PREVIEW_CUSTOM_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📝 Common Examples", callback_data="preview_examples")],
+    [InlineKeyboardButton("🔙 Back", callback_data="preview_main")]
+])
+
+_PREVIEW_BATCH_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📋 Full List", callback_data="preview_full_batch")],
+    [InlineKeyboardButton("💾 Export", callback_data="preview_export")],
+    [InlineKeyboardButton("🔄 Apply All", callback_data="preview_apply_all")],
+    [InlineKeyboardButton("🔙 Back", callback_data="preview_main")]
+])
+
+_PREVIEW_LIVE_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📝 Change Template", callback_data="preview_live_template")],
+    [InlineKeyboardButton("🔄 Change Mode", callback_data="preview_live_mode")],
+    [InlineKeyboardButton("🔧 Replace Rules", callback_data="preview_live_replace")],
+    [InlineKeyboardButton("🎯 Test File", callback_data="preview_live_test")],
+    [InlineKeyboardButton("🔙 Back", callback_data="preview_main")]
+])
+
+_PREVIEW_CATEGORY_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📝 More Samples", callback_data="preview_samples")],
+    [InlineKeyboardButton("✏️ Test Custom", callback_data="preview_custom")],
+    [InlineKeyboardButton("🔙 Back", callback_data="preview_samples")]
+])
+
+_PREVIEW_RESULT_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✏️ Test Another", callback_data="preview_custom")],
+    [InlineKeyboardButton("🔙 Back to Preview", callback_data="preview_main")]
+])
+
+@functools.lru_cache(maxsize=256)
+def _render_preview_menu_text(rename_mode: str, detail) -> str:
+    """Render the preview menu body for a mode and its template or rule count"""
+    message_text = "🔍 **Rename Preview**\n\n"
+    message_text += "See how your current settings will rename files:\n\n"
+
+    message_text += f"**Current Mode:** {rename_mode.title()}\n"
+
+    if rename_mode == 'auto':
+        message_text += f"**Template:** `{detail}`\n"
+    elif rename_mode == 'replace':
+        message_text += f"**Replace Rules:** {detail} active\n"
+
+    message_text += "\n**Options:**\n"
+    message_text += "• Preview with sample files\n"
+    message_text += "• Test with custom filename\n"
+    message_text += "• Batch preview multiple files\n"
+    return message_text
+
+async def _edit_preview_message(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, reply_markup: InlineKeyboardMarkup):
+    """Edit the callback message, skipping edits that would not change it"""
+    query = update.callback_query
+    message = query.message
+    view = (message.message_id if message else None, text, reply_markup)
+
+    # The live keyboard check catches edits made outside this function, such
+    # as another handler's menu or an error message, that left the memo stale
+    if (context.chat_data.get('_preview_last_view') == view
+            and message and message.reply_markup == reply_markup):
+        return
+
+    try:
+        await query.edit_message_text(
+            text,
+            parse_mode="Markdown",
+            reply_markup=reply_markup
+        )
+    except BadRequest as e:
+        if 'not modified' not in str(e).lower():
+            raise
+
+    context.chat_data['_preview_last_view'] = view
+
 @require_auth
 @subscription_required
 async def preview_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -37,46 +203,23 @@ async def show_preview_menu(update: Update, context: ContextTypes.DEFAULT_TYPE,
         settings = await db.get_user_settings(user_id)
         rename_mode = get_user_rename_mode(settings)
 
-        message_text = "🔍 **Rename Preview**\n\n"
-        message_text += "See how your current settings will rename files:\n\n"
-
-        message_text += f"**Current Mode:** {rename_mode.title()}\n"
-
         if rename_mode == 'auto':
-            template = getattr(settings, 'rename_template', '{title}')
-            message_text += f"**Template:** `{template}`\n"
+            detail = getattr(settings, 'rename_template', '{title}')
         elif rename_mode == 'replace':
-            replace_rules = get_user_replace_rules(settings)
-            rule_count = len(replace_rules)
-            message_text += f"**Replace Rules:** {rule_count} active\n"
-
-        message_text += "\n**Options:**\n"
-        message_text += "• Preview with sample files\n"
-        message_text += "• Test with custom filename\n"
-        message_text += "• Batch preview multiple files\n"
-
-        keyboard = [
-            [InlineKeyboardButton("📝 Sample Files", callback_data="preview_samples")],
-            [InlineKeyboardButton("✏️ Custom Test", callback_data="preview_custom")],
-            [InlineKeyboardButton("📊 Batch Preview", callback_data="preview_batch")],
-            [InlineKeyboardButton("🔄 Live Preview", callback_data="preview_live")],
-            [InlineKeyboardButton("🏠 Back", callback_data="settings_main")]
-        ]
+            detail = len(get_user_replace_rules(settings))
+        else:
+            detail = None
 
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        message_text = _render_preview_menu_text(rename_mode, detail)
 
         if update.message:
             await update.message.reply_text(
                 message_text,
                 parse_mode="Markdown",
-                reply_markup=reply_markup
+                reply_markup=_PREVIEW_MAIN_KB
             )
         else:
-            await update.callback_query.edit_message_text(
-                message_text,
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
+            await _edit_preview_message(update, context, message_text, _PREVIEW_MAIN_KB)
 
     except Exception as e:
         logger.error(f"Error showing preview menu: {e}")
@@ -98,10 +241,11 @@ async def preview_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif data == "preview_batch":
             await show_batch_preview(update, context, user_id)
         elif data == "preview_live":
-            await show_live_preview(update, context, user_id)
-        elif data.startswith("preview_category_"):
-            category = data.split("_")[2]
-            await show_category_preview(update, context, user_id, category)
+            await schedule_live_preview(update, context, user_id)
+        elif data.startswith(_CATEGORY_PREFIX):
+            category = data[len(_CATEGORY_PREFIX):]
+            if category in _CATEGORY_FILES:
+                await show_category_preview(update, context, user_id, category)
 
     except Exception as e:
         logger.error(f"Error handling preview callback: {e}")
@@ -115,50 +259,14 @@ async def show_sample_preview(update: Update, context: ContextTypes.DEFAULT_TYPE
         preview_text = "📝 **Sample Files Preview**\n\n"
         preview_text += "Here's how your settings will rename different types of files:\n\n"
 
-        # Sample files for different categories
-        sample_files = {
-            "TV Shows": [
-                "Game.of.Thrones.S01E01.1080p.BluRay.x264-GROUP.mkv",
-                "Breaking.Bad.S05E14.720p.HDTV.x264-IMMERSE.mp4",
-                "The.Office.US.S02E10.WEB-DL.1080p.H264.mp4"
-            ],
-            "Movies": [
-                "The.Dark.Knight.2008.1080p.BluRay.x264-SPARKS.mkv",
-                "Inception.2010.720p.BRRip.x264-YIFY.mp4",
-                "Avengers.Endgame.2019.4K.UHD.BluRay.x265-TERMINAL.mkv"
-            ],
-            "Documents": [
-                "Important.Document.2024.pdf",
-                "Meeting.Notes.Jan.15.2024.docx",
-                "Project.Report.Final.Version.pdf"
-            ],
-            "Audio": [
-                "Artist.Name.Song.Title.320kbps.mp3",
-                "Album.Name.Track.01.Artist.Name.flac",
-                "Podcast.Episode.123.Audio.Quality.mp3"
-            ]
-        }
-
-        for category, files in sample_files.items():
+        for category, files in _SAMPLE_FILES:
             preview_text += f"**{category}:**\n"
             for original in files[:2]:  # Show first 2 files
                 renamed = preview_rename(original, settings)
                 preview_text += f"• `{original}`\n"
                 preview_text += f"  → `{renamed}`\n\n"
 
-        keyboard = [
-            [InlineKeyboardButton("📺 TV Shows", callback_data="preview_category_tv")],
-            [InlineKeyboardButton("🎬 Movies", callback_data="preview_category_movies")],
-            [InlineKeyboardButton("📄 Documents", callback_data="preview_category_docs")],
-            [InlineKeyboardButton("🎵 Audio", callback_data="preview_category_audio")],
-            [InlineKeyboardButton("🔙 Back", callback_data="preview_main")]
-        ]
-
-        await update.callback_query.edit_message_text(
-            preview_text,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        await _edit_preview_message(update, context, preview_text, _PREVIEW_SAMPLES_KB)
 
     except Exception as e:
         logger.error(f"Error showing sample preview: {e}")
@@ -180,16 +288,7 @@ async def show_custom_preview(update: Update, context: ContextTypes.DEFAULT_TYPE
         custom_text += "• `Audio.Track.Artist.Name.mp3`\n\n"
         custom_text += "**Send a filename to test:**"
 
-        keyboard = [
-            [InlineKeyboardButton("📝 Common Examples", callback_data="preview_examples")],
-            [InlineKeyboardButton("🔙 Back", callback_data="preview_main")]
-        ]
-
-        await update.callback_query.edit_message_text(
-            custom_text,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        await _edit_preview_message(update, context, custom_text, _PREVIEW_CUSTOM_KB)
 
         # Set state for text input
         context.user_data['waiting_for_preview_filename'] = True
@@ -228,18 +327,7 @@ async def show_batch_preview(update: Update, context: ContextTypes.DEFAULT_TYPE,
         batch_text += "• Export preview to file\n"
         batch_text += "• Apply to all files\n"
 
-        keyboard = [
-            [InlineKeyboardButton("📋 Full List", callback_data="preview_full_batch")],
-            [InlineKeyboardButton("💾 Export", callback_data="preview_export")],
-            [InlineKeyboardButton("🔄 Apply All", callback_data="preview_apply_all")],
-            [InlineKeyboardButton("🔙 Back", callback_data="preview_main")]
-        ]
-
-        await update.callback_query.edit_message_text(
-            batch_text,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        await _edit_preview_message(update, context, batch_text, _PREVIEW_BATCH_KB)
 
     except Exception as e:
         logger.error(f"Error showing batch preview: {e}")
@@ -259,90 +347,50 @@ async def show_live_preview(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
         live_text += "**Quick Settings:**\n"
 
-        keyboard = [
-            [InlineKeyboardButton("📝 Change Template", callback_data="preview_live_template")],
-            [InlineKeyboardButton("🔄 Change Mode", callback_data="preview_live_mode")],
-            [InlineKeyboardButton("🔧 Replace Rules", callback_data="preview_live_replace")],
-            [InlineKeyboardButton("🎯 Test File", callback_data="preview_live_test")],
-            [InlineKeyboardButton("🔙 Back", callback_data="preview_main")]
-        ]
-
-        await update.callback_query.edit_message_text(
-            live_text,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        await _edit_preview_message(update, context, live_text, _PREVIEW_LIVE_KB)
 
     except Exception as e:
         logger.error(f"Error showing live preview: {e}")
         await update.callback_query.edit_message_text("❌ Error loading live preview.")
 
+async def schedule_live_preview(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+    """Coalesce rapid live preview requests so only the latest one edits the message"""
+    now = time.monotonic()
+    last_ts = context.user_data.get('_preview_live_last_edit_ts', 0.0)
+    context.user_data['_preview_live_last_edit_ts'] = now
+
+    pending = context.user_data.pop('_preview_live_pending', None)
+    if pending and not pending.done():
+        pending.cancel()
+
+    if now - last_ts >= _LIVE_PREVIEW_DEBOUNCE:
+        await show_live_preview(update, context, user_id)
+        return
+
+    async def _delayed_edit():
+        await asyncio.sleep(_LIVE_PREVIEW_DEBOUNCE)
+        await show_live_preview(update, context, user_id)
+
+    context.user_data['_preview_live_pending'] = asyncio.create_task(_delayed_edit())
+
 async def show_category_preview(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, category: str):
     """Show preview for specific file category"""
     try:
-        category_files = {
-            "tv": [
-                "Game.of.Thrones.S01E01.1080p.BluRay.x264-GROUP.mkv",
-                "Breaking.Bad.S05E14.720p.HDTV.x264-IMMERSE.mp4",
-                "The.Office.US.S02E10.WEB-DL.1080p.H264.mp4",
-                "Stranger.Things.S04E01.2160p.NF.WEB-DL.x265-NTb.mkv",
-                "Friends.S01E01.720p.BluRay.x264-PSYCHD.mkv"
-            ],
-            "movies": [
-                "The.Dark.Knight.2008.1080p.BluRay.x264-SPARKS.mkv",
-                "Inception.2010.720p.BRRip.x264-YIFY.mp4",
-                "Avengers.Endgame.2019.4K.UHD.BluRay.x265-TERMINAL.mkv",
-                "Pulp.Fiction.1994.1080p.BluRay.x264-AMIABLE.mkv",
-                "The.Matrix.1999.2160p.UHD.BluRay.x265-SCOTCH.mkv"
-            ],
-            "docs": [
-                "Important.Document.2024.pdf",
-                "Meeting.Notes.Jan.15.2024.docx",
-                "Project.Report.Final.Version.pdf",
-                "User.Manual.Version.2.1.pdf",
-                "Presentation.Slides.Marketing.pptx"
-            ],
-            "audio": [
-                "Artist.Name.Song.Title.320kbps.mp3",
-                "Album.Name.Track.01.Artist.Name.flac",
-                "Podcast.Episode.123.Audio.Quality.mp3",
-                "Classical.Music.Symphony.No.5.wav",
-                "Electronic.Dance.Music.Mix.2024.mp3"
-            ]
-        }
-
-        category_names = {
-            "tv": "📺 TV Shows",
-            "movies": "🎬 Movies", 
-            "docs": "📄 Documents",
-            "audio": "🎵 Audio Files"
-        }
-
-        if category not in category_files:
+        if category not in _CATEGORY_FILES:
             await update.callback_query.edit_message_text("❌ Invalid category.")
             return
 
         settings = await db.get_user_settings(user_id)
 
-        preview_text = f"{category_names[category]} **Preview**\n\n"
+        preview_text = f"{_CATEGORY_NAMES[category]} **Preview**\n\n"
         preview_text += "Here's how your settings will rename these files:\n\n"
 
-        for original in category_files[category]:
+        for original in _CATEGORY_FILES[category]:
             renamed = preview_rename(original, settings)
             preview_text += f"**Original:** `{original}`\n"
             preview_text += f"**Renamed:** `{renamed}`\n\n"
 
-        keyboard = [
-            [InlineKeyboardButton("📝 More Samples", callback_data="preview_samples")],
-            [InlineKeyboardButton("✏️ Test Custom", callback_data="preview_custom")],
-            [InlineKeyboardButton("🔙 Back", callback_data="preview_samples")]
-        ]
-
-        await update.callback_query.edit_message_text(
-            preview_text,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        await _edit_preview_message(update, context, preview_text, _PREVIEW_CATEGORY_KB)
 
     except Exception as e:
         logger.error(f"Error showing category preview: {e}")
@@ -362,7 +410,7 @@ def preview_rename(filename: str, settings) -> str:
         elif rename_mode == 'replace':
             # Apply replacement rules
             replace_rules = get_user_replace_rules(settings)
-            return apply_replace_rules(filename, replace_rules)
+            return apply_replace_rules(filename, replace_rules, is_replace_mode_enabled(settings))
 
         elif rename_mode == 'manual':
             return f"[Manual: {filename}]"
@@ -407,15 +455,10 @@ async def handle_preview_filename_input(update: Update, context: ContextTypes.DE
 
         preview_text += "\n**Try another filename or go back to menu:**"
 
-        keyboard = [
-            [InlineKeyboardButton("✏️ Test Another", callback_data="preview_custom")],
-            [InlineKeyboardButton("🔙 Back to Preview", callback_data="preview_main")]
-        ]
-
         await update.message.reply_text(
             preview_text,
             parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=_PREVIEW_RESULT_KB
         )
 
         # Keep waiting for more input
@@ -425,30 +468,39 @@ async def handle_preview_filename_input(update: Update, context: ContextTypes.DE
         logger.error(f"Error handling preview filename input: {e}")
         await update.message.reply_text("❌ Error processing filename preview.")
 
-async def generate_preview_report(filenames: list, settings) -> str:
-    """Generate a detailed preview report"""
+async def generate_preview_report(filenames: list, settings) -> AsyncIterator[str]:
+    """Generate a detailed preview report, yielding it in chunks
+
+    Renamed entries are emitted in batches of _REPORT_BATCH_SIZE so large
+    file lists never have to be held in memory as a single string.
+    """
     try:
-        report = "📊 **Rename Preview Report**\n\n"
-        report += f"**Total Files:** {len(filenames)}\n"
-        report += f"**Mode:** {get_user_rename_mode(settings).title()}\n"
+        rename_mode = get_user_rename_mode(settings)
+
+        header = "📊 **Rename Preview Report**\n\n"
+        header += f"**Total Files:** {len(filenames)}\n"
+        header += f"**Mode:** {rename_mode.title()}\n"
 
-        if get_user_rename_mode(settings) == 'auto':
+        if rename_mode == 'auto':
             template = getattr(settings, 'rename_template', '{title}')
-            report += f"**Template:** `{template}`\n"
-        elif get_user_rename_mode(settings) == 'replace':
+            header += f"**Template:** `{template}`\n"
+        elif rename_mode == 'replace':
             replace_rules = get_user_replace_rules(settings)
-            report += f"**Rules:** {len(replace_rules)} active\n"
-
-        report += f"**Generated:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+            header += f"**Rules:** {len(replace_rules)} active\n"
 
-        report += "**Preview Results:**\n"
-        for i, filename in enumerate(filenames, 1):
-            renamed = preview_rename(filename, settings)
-            report += f"{i}. `{filename}`\n"
-            report += f"   → `{renamed}`\n\n"
+        header += f"**Generated:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        header += "**Preview Results:**\n"
+        yield header
 
-        return report
+        for start in range(0, len(filenames), _REPORT_BATCH_SIZE):
+            batch = filenames[start:start + _REPORT_BATCH_SIZE]
+            yield "".join(
+                f"{i}. `{filename}`\n   → `{preview_rename(filename, settings)}`\n\n"
+                for i, filename in enumerate(batch, start + 1)
+            )
+            # Let other updates run between batches of a long report
+            await asyncio.sleep(0)
 
     except Exception as e:
         logger.error(f"Error generating preview report: {e}")
-        return "❌ Error generating preview report."
\ No newline at end of file
+        yield "❌ Error generating preview report."
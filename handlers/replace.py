@@ -2,103 +2,364 @@
 Text replacement functionality for file renaming
 """
 
+import asyncio
+import functools
 import logging
 import json
-from typing import List, Dict, Any
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Set
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
 from database.connection import db
 from middleware.auth import require_auth
 from middleware.subscription_check import subscription_required
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+# Rulesets larger than this use an Aho-Corasick automaton when available
+_AHOCORASICK_MIN_RULES = 8
+
+# Static keyboards, built once at import time
+_MAIN_MENU_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Add Rule", callback_data="replace_add")],
+    [InlineKeyboardButton("📝 Edit Rules", callback_data="replace_edit")],
+    [InlineKeyboardButton("🔄 Preview", callback_data="replace_preview")],
+    [InlineKeyboardButton("⚙️ Settings", callback_data="replace_settings")],
+    [InlineKeyboardButton("🏠 Back", callback_data="settings_main")]
+])
+
+_ADD_RULE_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📝 Custom Rule", callback_data="replace_custom")],
+    [InlineKeyboardButton("🔹 . → (space)", callback_data="replace_quick_dot_space")],
+    [InlineKeyboardButton("🔹 _ → (space)", callback_data="replace_quick_under_space")],
+    [InlineKeyboardButton("🔹 Common Replacements", callback_data="replace_common")],
+    [InlineKeyboardButton("🔙 Back", callback_data="replace_main")]
+])
+
+_PREVIEW_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔄 Test Custom", callback_data="replace_test_custom")],
+    [InlineKeyboardButton("🔙 Back", callback_data="replace_main")]
+])
+
+_RULE_ADDED_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔄 Preview", callback_data="replace_preview")],
+    [InlineKeyboardButton("🏠 Back to Settings", callback_data="settings_main")]
+])
+
+_BACK_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔙 Back to Rules", callback_data="replace_edit")]
+])
+
+_ADD_OR_BACK_KB = InlineKeyboardMarkup([[
+    InlineKeyboardButton("➕ Add Rule", callback_data="replace_add"),
+    InlineKeyboardButton("🔙 Back", callback_data="replace_main")
+]])
+
+# Static sections of the menu texts
+_MENU_HEADER = (
+    "🔄 **Text Replacement Settings**\n\n"
+    "Configure automatic text replacement in filenames.\n\n"
+)
+
+_MENU_OPTIONS = (
+    "\n**Options:**\n"
+    "• Add new replacement rule\n"
+    "• Edit existing rules\n"
+    "• Test replacement preview\n"
+    "• Toggle replacement mode\n"
+)
+
+_ADD_RULE_TEXT = (
+    "➕ **Add Replacement Rule**\n\n"
+    "Create a new text replacement rule:\n\n"
+    "**Format:** Send two messages:\n"
+    "1. Text to replace (old text)\n"
+    "2. Replacement text (new text)\n\n"
+    "**Examples:**\n"
+    "• Replace `.` with ` ` (spaces)\n"
+    "• Replace `_` with ` ` (underscores to spaces)\n"
+    "• Replace `HDTV` with `HD TV`\n"
+    "• Replace `1080p` with `Full HD`\n\n"
+    "**Quick Templates:**"
+)
+
+_PREVIEW_HEADER = (
+    "🔄 **Replacement Preview**\n\n"
+    "Here's how your rules will transform filenames:\n\n"
+)
+
+# Sample filenames for preview
+_PREVIEW_SAMPLES = (
+    "Movie.Name.2024.1080p.BluRay.x264-GROUP",
+    "TV_Show_S01E01_HDTV_720p",
+    "Document.File.Name.with.dots.pdf",
+    "Audio_Track_Name_192kbps.mp3"
+)
+
+_SETTINGS_HEADER = (
+    "⚙️ **Replacement Settings**\n\n"
+    "Configure how text replacement works:\n\n"
+)
+
+_SETTINGS_OPTIONS = (
+    "**Options:**\n"
+    "• Toggle replacement on/off\n"
+    "• Enable/disable case sensitivity\n"
+    "• Clear all rules\n"
+)
+
+@dataclass
+class _CachedRules:
+    """Parsed replace rules for one user plus data derived from them"""
+    loaded_at: float
+    rules: List[Dict[str, Any]]
+    rule_buttons: Optional[List[List[InlineKeyboardButton]]] = None
+    # Casefolded 'old' texts (counted, as stored rulesets may hold duplicates)
+    # for constant-time duplicate checks; built from the rules when not given
+    old_keys: Optional[Counter] = None
+
+    def __post_init__(self):
+        if self.old_keys is None:
+            self.old_keys = Counter(rule['old'].casefold() for rule in self.rules)
+
+    def get_rule_buttons(self) -> List[List[InlineKeyboardButton]]:
+        """Build the edit-menu button rows once per ruleset"""
+        if self.rule_buttons is None:
+            self.rule_buttons = [
+                [InlineKeyboardButton(
+                    f"{'✅' if rule.get('enabled', True) else '❌'} {rule['old']} → {rule['new']}",
+                    callback_data=f"replace_edit_{i}"
+                )]
+                for i, rule in enumerate(self.rules)
+            ]
+        return self.rule_buttons
+
+# Parsed replace rules per user, refreshed after _RULES_CACHE_TTL seconds
+_rules_cache: Dict[int, _CachedRules] = {}
+_RULES_CACHE_TTL = 60  # seconds
+_RULES_CACHE_MAX_SIZE = 10000
+
+def _cache_rules(user_id: int, cached: _CachedRules):
+    """Store a user's cache entry, evicting the oldest entry when full"""
+    # Re-insert so the dict stays ordered oldest-first, then trim. Entries
+    # with unflushed writes are newer than the database and are never evicted
+    _rules_cache.pop(user_id, None)
+    if len(_rules_cache) >= _RULES_CACHE_MAX_SIZE:
+        for key in _rules_cache:
+            if not _has_unflushed_writes(key):
+                del _rules_cache[key]
+                break
+    _rules_cache[user_id] = cached
+
+async def _get_cached_rules(user_id: int) -> _CachedRules:
+    """Get a user's cache entry, loading it from the database when stale
+
+    An entry with unflushed writes is served regardless of age, since the
+    database does not have those changes yet.
+    """
+    cached = _rules_cache.get(user_id)
+    if cached and (time.time() - cached.loaded_at < _RULES_CACHE_TTL or _has_unflushed_writes(user_id)):
+        return cached
+
+    settings = await db.get_user_settings(user_id)
+    cached = _CachedRules(time.time(), get_user_replace_rules(settings))
+    _cache_rules(user_id, cached)
+    return cached
+
+async def _get_rules(user_id: int) -> List[Dict[str, Any]]:
+    """Get a user's parsed replace rules, served from cache while fresh
+
+    The returned list is shared with the cache; copy it before mutating.
+    """
+    return (await _get_cached_rules(user_id)).rules
+
+# Write-behind buffer for rule changes: user_id -> ordered single-rule operations
+_pending_writes: Dict[int, List[Dict[str, Any]]] = {}
+_flush_tasks: Dict[int, asyncio.Task] = {}
+# Users whose buffered operations are being written right now
+_writing: Set[int] = set()
+_WRITE_DEBOUNCE = 0.05  # seconds
+
+def _has_unflushed_writes(user_id: int) -> bool:
+    """Check whether the user has rule changes the database doesn't have yet"""
+    return user_id in _pending_writes or user_id in _writing
+
+async def _flush_write(user_id: int):
+    """Write a user's buffered rule operations once the debounce window ends"""
+    await asyncio.sleep(_WRITE_DEBOUNCE)
+
+    # Past this point the task can no longer be cancelled by _schedule_write
+    _flush_tasks.pop(user_id, None)
+    operations = _pending_writes.pop(user_id, None)
+    if not operations:
+        return
+
+    _writing.add(user_id)
+    try:
+        success = await db.apply_replace_rule_ops(user_id, operations)
+    finally:
+        _writing.discard(user_id)
+
+    if not success:
+        logger.error(f"Error flushing replace rules for user {user_id}")
+        _rules_cache.pop(user_id, None)
+
+def _schedule_write(user_id: int, operation: Dict[str, Any]):
+    """Queue a rule operation for the user and restart its debounce"""
+    _pending_writes.setdefault(user_id, []).append(operation)
+
+    task = _flush_tasks.get(user_id)
+    if task:
+        task.cancel()
+
+    _flush_tasks[user_id] = asyncio.create_task(_flush_write(user_id))
+
+async def flush_pending_writes():
+    """Write all buffered rule operations immediately (called on shutdown)"""
+    for task in _flush_tasks.values():
+        task.cancel()
+    _flush_tasks.clear()
+
+    while _pending_writes:
+        user_id, operations = _pending_writes.popitem()
+        await db.apply_replace_rule_ops(user_id, operations)
+
+def _save_rules(user_id: int, replace_rules: List[Dict[str, Any]], operation: Dict[str, Any]):
+    """Cache a user's new replace rules and queue the single-rule change that produced them"""
+    # Carry the duplicate-check keys over, updating them for this change only
+    previous = _rules_cache.get(user_id)
+    old_keys = None
+    if previous is not None:
+        old_keys = previous.old_keys
+        if operation['op'] == 'add':
+            old_keys[operation['rule']['old'].casefold()] += 1
+        elif operation['op'] == 'delete':
+            key = operation['old'].casefold()
+            old_keys[key] -= 1
+            if old_keys[key] <= 0:
+                del old_keys[key]
+
+    _cache_rules(user_id, _CachedRules(time.time(), replace_rules, old_keys=old_keys))
+    _schedule_write(user_id, operation)
+
+async def _edit_view(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, reply_markup: InlineKeyboardMarkup):
+    """Edit the callback message unless the user is already looking at this view"""
+    query = update.callback_query
+    message = query.message
+    view = (message.message_id if message else None, text, reply_markup)
+
+    # The live keyboard check catches edits made outside _edit_view, such as
+    # another handler's menu or an error message, that left the memo stale
+    if (context.chat_data.get('_replace_last_view') == view
+            and message and message.reply_markup == reply_markup):
+        return
+
+    try:
+        await query.edit_message_text(
+            text,
+            parse_mode="Markdown",
+            reply_markup=reply_markup
+        )
+    except BadRequest as e:
+        if 'not modified' not in str(e).lower():
+            raise
+
+    context.chat_data['_replace_last_view'] = view
+
+async def _edit_out_of_view(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    """Edit the callback message to a one-off text and forget the last menu view"""
+    context.chat_data.pop('_replace_last_view', None)
+    await update.callback_query.edit_message_text(text)
+
+def safe_handler(label: str, error_text: str):
+    """Decorator that logs a handler's failure and shows error_text to the user"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+            try:
+                return await func(update, context, *args, **kwargs)
+            except Exception as e:
+                logger.error("Error %s: %s", label, e)
+                if update.callback_query:
+                    await _edit_out_of_view(update, context, error_text)
+                else:
+                    await update.message.reply_text(error_text)
+        
+        return wrapper
+    return decorator
+
 @require_auth
 @subscription_required
+@safe_handler("in replace command", "❌ An error occurred while loading text replacement settings.")
 async def replace_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /replace command"""
     user_id = update.effective_user.id
     
-    try:
-        await show_replace_menu(update, context, user_id)
-    except Exception as e:
-        logger.error(f"Error in replace command: {e}")
-        await update.message.reply_text(
-            "❌ An error occurred while loading text replacement settings."
-        )
+    await show_replace_menu(update, context, user_id)
 
 @require_auth
 @subscription_required
+@safe_handler("in setreplace command", "❌ An error occurred while setting replacement rules.")
 async def setreplace_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /setreplace command"""
     user_id = update.effective_user.id
     
-    try:
-        if context.args and len(context.args) >= 2:
-            # Direct command usage: /setreplace "old text" "new text"
-            old_text = context.args[0]
-            new_text = context.args[1]
-            await add_replace_rule(update, context, user_id, old_text, new_text)
-        else:
-            # Show interactive menu
-            await show_add_replace_rule(update, context, user_id)
-    except Exception as e:
-        logger.error(f"Error in setreplace command: {e}")
-        await update.message.reply_text(
-            "❌ An error occurred while setting replacement rules."
-        )
+    if context.args and len(context.args) >= 2:
+        # Direct command usage: /setreplace "old text" "new text"
+        old_text = context.args[0]
+        new_text = context.args[1]
+        await add_replace_rule(update, context, user_id, old_text, new_text)
+    else:
+        # Show interactive menu
+        await show_add_replace_rule(update, context, user_id)
 
+@safe_handler("showing replace menu", "❌ Error loading replacement settings.")
 async def show_replace_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Show text replacement main menu"""
-    try:
-        # Get current replacement rules
-        settings = await db.get_user_settings(user_id)
-        replace_rules = json.loads(getattr(settings, 'replace_rules', '[]'))
-        
-        message_text = "🔄 **Text Replacement Settings**\n\n"
-        message_text += "Configure automatic text replacement in filenames.\n\n"
-        
-        if replace_rules:
-            message_text += "**Active Rules:**\n"
-            for i, rule in enumerate(replace_rules, 1):
-                message_text += f"{i}. `{rule['old']}` → `{rule['new']}`\n"
-        else:
-            message_text += "**No replacement rules configured.**\n"
-        
-        message_text += "\n**Options:**\n"
-        message_text += "• Add new replacement rule\n"
-        message_text += "• Edit existing rules\n"
-        message_text += "• Test replacement preview\n"
-        message_text += "• Toggle replacement mode\n"
-        
-        keyboard = [
-            [InlineKeyboardButton("➕ Add Rule", callback_data="replace_add")],
-            [InlineKeyboardButton("📝 Edit Rules", callback_data="replace_edit")],
-            [InlineKeyboardButton("🔄 Preview", callback_data="replace_preview")],
-            [InlineKeyboardButton("⚙️ Settings", callback_data="replace_settings")],
-            [InlineKeyboardButton("🏠 Back", callback_data="settings_main")]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        if update.message:
-            await update.message.reply_text(
-                message_text,
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
-        else:
-            await update.callback_query.edit_message_text(
-                message_text,
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
-            
-    except Exception as e:
-        logger.error(f"Error showing replace menu: {e}")
-        await update.message.reply_text("❌ Error loading replacement settings.")
+    # Get current replacement rules
+    replace_rules = await _get_rules(user_id)
+    
+    parts = [_MENU_HEADER]
+    
+    if replace_rules:
+        parts.append("**Active Rules:**\n")
+        parts.extend(
+            f"{i}. `{rule['old']}` → `{rule['new']}`\n"
+            for i, rule in enumerate(replace_rules, 1)
+        )
+    else:
+        parts.append("**No replacement rules configured.**\n")
+    
+    parts.append(_MENU_OPTIONS)
+    message_text = "".join(parts)
+    
+    if update.message:
+        await update.message.reply_text(
+            message_text,
+            parse_mode="Markdown",
+            reply_markup=_MAIN_MENU_KB
+        )
+    else:
+        await _edit_view(update, context, message_text, _MAIN_MENU_KB)
 
+@safe_handler("handling replace callback", "❌ Error processing replacement settings.")
 async def replace_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle replace callback queries"""
     query = update.callback_query
@@ -107,334 +368,351 @@ async def replace_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     data = query.data
     
-    try:
-        if data == "replace_add":
-            await show_add_replace_rule(update, context, user_id)
-        elif data == "replace_edit":
-            await show_edit_replace_rules(update, context, user_id)
-        elif data == "replace_preview":
-            await show_replace_preview(update, context, user_id)
-        elif data == "replace_settings":
-            await show_replace_settings(update, context, user_id)
-        elif data.startswith("replace_delete_"):
-            rule_index = int(data.split("_")[2])
-            await delete_replace_rule(update, context, user_id, rule_index)
-        elif data.startswith("replace_toggle_"):
-            rule_index = int(data.split("_")[2])
-            await toggle_replace_rule(update, context, user_id, rule_index)
-            
-    except Exception as e:
-        logger.error(f"Error handling replace callback: {e}")
-        await query.edit_message_text("❌ Error processing replacement settings.")
+    handler = _CB_MENU_ACTIONS.get(data)
+    if handler:
+        await handler(update, context, user_id)
+        return
+    
+    action, _, rule_index = data.rpartition("_")
+    handler = _CB_RULE_ACTIONS.get(action)
+    if handler:
+        await handler(update, context, user_id, int(rule_index))
 
+@safe_handler("showing add replace rule", "❌ Error loading add rule interface.")
 async def show_add_replace_rule(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Show add replacement rule interface"""
-    try:
-        add_text = "➕ **Add Replacement Rule**\n\n"
-        add_text += "Create a new text replacement rule:\n\n"
-        add_text += "**Format:** Send two messages:\n"
-        add_text += "1. Text to replace (old text)\n"
-        add_text += "2. Replacement text (new text)\n\n"
-        add_text += "**Examples:**\n"
-        add_text += "• Replace `.` with ` ` (spaces)\n"
-        add_text += "• Replace `_` with ` ` (underscores to spaces)\n"
-        add_text += "• Replace `HDTV` with `HD TV`\n"
-        add_text += "• Replace `1080p` with `Full HD`\n\n"
-        add_text += "**Quick Templates:**"
-        
-        keyboard = [
-            [InlineKeyboardButton("📝 Custom Rule", callback_data="replace_custom")],
-            [InlineKeyboardButton("🔹 . → (space)", callback_data="replace_quick_dot_space")],
-            [InlineKeyboardButton("🔹 _ → (space)", callback_data="replace_quick_under_space")],
-            [InlineKeyboardButton("🔹 Common Replacements", callback_data="replace_common")],
-            [InlineKeyboardButton("🔙 Back", callback_data="replace_main")]
-        ]
-        
-        await update.callback_query.edit_message_text(
-            add_text,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        
-    except Exception as e:
-        logger.error(f"Error showing add replace rule: {e}")
-        await update.callback_query.edit_message_text("❌ Error loading add rule interface.")
+    await _edit_view(update, context, _ADD_RULE_TEXT, _ADD_RULE_KB)
 
+@safe_handler("showing edit replace rules", "❌ Error loading edit interface.")
 async def show_edit_replace_rules(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Show edit replacement rules interface"""
-    try:
-        settings = await db.get_user_settings(user_id)
-        replace_rules = json.loads(getattr(settings, 'replace_rules', '[]'))
-        
-        if not replace_rules:
-            await update.callback_query.edit_message_text(
-                "❌ No replacement rules found. Add some rules first!",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("➕ Add Rule", callback_data="replace_add"),
-                    InlineKeyboardButton("🔙 Back", callback_data="replace_main")
-                ]])
-            )
-            return
-        
-        edit_text = "📝 **Edit Replacement Rules**\n\n"
-        edit_text += "Select a rule to edit or delete:\n\n"
-        
-        keyboard = []
-        for i, rule in enumerate(replace_rules):
-            status = "✅" if rule.get('enabled', True) else "❌"
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"{status} {rule['old']} → {rule['new']}", 
-                    callback_data=f"replace_edit_{i}"
-                )
-            ])
-        
-        keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="replace_main")])
-        
-        await update.callback_query.edit_message_text(
-            edit_text,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+    cached = await _get_cached_rules(user_id)
+    
+    if not cached.rules:
+        await _edit_view(
+            update,
+            context,
+            "❌ No replacement rules found. Add some rules first!",
+            _ADD_OR_BACK_KB
         )
-        
-    except Exception as e:
-        logger.error(f"Error showing edit replace rules: {e}")
-        await update.callback_query.edit_message_text("❌ Error loading edit interface.")
+        return
+    
+    edit_text = "📝 **Edit Replacement Rules**\n\n"
+    edit_text += "Select a rule to edit or delete:\n\n"
+    
+    keyboard = cached.get_rule_buttons() + [
+        [InlineKeyboardButton("🔙 Back", callback_data="replace_main")]
+    ]
+    
+    await _edit_view(update, context, edit_text, InlineKeyboardMarkup(keyboard))
 
+@safe_handler("showing replace preview", "❌ Error generating preview.")
 async def show_replace_preview(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Show replacement preview with examples"""
-    try:
-        settings = await db.get_user_settings(user_id)
-        replace_rules = json.loads(getattr(settings, 'replace_rules', '[]'))
-        
-        if not replace_rules:
-            await update.callback_query.edit_message_text(
-                "❌ No replacement rules found. Add some rules first!",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("➕ Add Rule", callback_data="replace_add"),
-                    InlineKeyboardButton("🔙 Back", callback_data="replace_main")
-                ]])
-            )
-            return
-        
-        preview_text = "🔄 **Replacement Preview**\n\n"
-        preview_text += "Here's how your rules will transform filenames:\n\n"
-        
-        # Sample filenames for preview
-        sample_files = [
-            "Movie.Name.2024.1080p.BluRay.x264-GROUP",
-            "TV_Show_S01E01_HDTV_720p",
-            "Document.File.Name.with.dots.pdf",
-            "Audio_Track_Name_192kbps.mp3"
-        ]
-        
-        for sample in sample_files:
-            transformed = apply_replace_rules(sample, replace_rules)
-            preview_text += f"**Before:** `{sample}`\n"
-            preview_text += f"**After:** `{transformed}`\n\n"
-        
-        keyboard = [
-            [InlineKeyboardButton("🔄 Test Custom", callback_data="replace_test_custom")],
-            [InlineKeyboardButton("🔙 Back", callback_data="replace_main")]
-        ]
-        
-        await update.callback_query.edit_message_text(
-            preview_text,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+    replace_rules = await _get_rules(user_id)
+    
+    if not replace_rules:
+        await _edit_view(
+            update,
+            context,
+            "❌ No replacement rules found. Add some rules first!",
+            _ADD_OR_BACK_KB
         )
-        
-    except Exception as e:
-        logger.error(f"Error showing replace preview: {e}")
-        await update.callback_query.edit_message_text("❌ Error generating preview.")
+        return
+    
+    parts = [_PREVIEW_HEADER]
+    
+    for sample in _PREVIEW_SAMPLES:
+        transformed = apply_replace_rules(sample, replace_rules)
+        parts.append(f"**Before:** `{sample}`\n**After:** `{transformed}`\n\n")
+    
+    preview_text = "".join(parts)
+    
+    await _edit_view(update, context, preview_text, _PREVIEW_KB)
 
+@safe_handler("showing replace settings", "❌ Error loading settings.")
 async def show_replace_settings(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Show replacement settings"""
-    try:
-        settings = await db.get_user_settings(user_id)
-        replace_enabled = getattr(settings, 'replace_enabled', True)
-        case_sensitive = getattr(settings, 'replace_case_sensitive', False)
-        
-        settings_text = "⚙️ **Replacement Settings**\n\n"
-        settings_text += "Configure how text replacement works:\n\n"
-        
-        settings_text += f"**Replacement Mode:** {'✅ Enabled' if replace_enabled else '❌ Disabled'}\n"
-        settings_text += f"**Case Sensitive:** {'✅ Yes' if case_sensitive else '❌ No'}\n\n"
-        
-        settings_text += "**Options:**\n"
-        settings_text += "• Toggle replacement on/off\n"
-        settings_text += "• Enable/disable case sensitivity\n"
-        settings_text += "• Clear all rules\n"
-        
-        keyboard = [
-            [InlineKeyboardButton(
-                "❌ Disable" if replace_enabled else "✅ Enable",
-                callback_data="replace_toggle_enabled"
-            )],
-            [InlineKeyboardButton(
-                "❌ Case Insensitive" if case_sensitive else "✅ Case Sensitive",
-                callback_data="replace_toggle_case"
-            )],
-            [InlineKeyboardButton("🗑️ Clear All Rules", callback_data="replace_clear_all")],
-            [InlineKeyboardButton("🔙 Back", callback_data="replace_main")]
-        ]
-        
-        await update.callback_query.edit_message_text(
-            settings_text,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        
-    except Exception as e:
-        logger.error(f"Error showing replace settings: {e}")
-        await update.callback_query.edit_message_text("❌ Error loading settings.")
+    settings = await db.get_user_settings(user_id)
+    replace_enabled = getattr(settings, 'replace_enabled', True)
+    case_sensitive = getattr(settings, 'replace_case_sensitive', False)
+    
+    settings_text = "".join((
+        _SETTINGS_HEADER,
+        f"**Replacement Mode:** {'✅ Enabled' if replace_enabled else '❌ Disabled'}\n",
+        f"**Case Sensitive:** {'✅ Yes' if case_sensitive else '❌ No'}\n\n",
+        _SETTINGS_OPTIONS
+    ))
+    
+    keyboard = [
+        [InlineKeyboardButton(
+            "❌ Disable" if replace_enabled else "✅ Enable",
+            callback_data="replace_toggle_enabled"
+        )],
+        [InlineKeyboardButton(
+            "❌ Case Insensitive" if case_sensitive else "✅ Case Sensitive",
+            callback_data="replace_toggle_case"
+        )],
+        [InlineKeyboardButton("🗑️ Clear All Rules", callback_data="replace_clear_all")],
+        [InlineKeyboardButton("🔙 Back", callback_data="replace_main")]
+    ]
+    
+    await _edit_view(update, context, settings_text, InlineKeyboardMarkup(keyboard))
 
+@safe_handler("adding replace rule", "❌ Error adding replacement rule.")
 async def add_replace_rule(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, old_text: str, new_text: str):
     """Add a new replacement rule"""
-    try:
-        settings = await db.get_user_settings(user_id)
-        replace_rules = json.loads(getattr(settings, 'replace_rules', '[]'))
-        
-        # Check if rule already exists
-        for rule in replace_rules:
-            if rule['old'] == old_text:
-                await update.message.reply_text(
-                    f"❌ Rule for '{old_text}' already exists. Use edit to modify it."
-                )
-                return
-        
-        # Add new rule
-        new_rule = {
-            'old': old_text,
-            'new': new_text,
-            'enabled': True,
-            'case_sensitive': False
-        }
-        replace_rules.append(new_rule)
+    cached = await _get_cached_rules(user_id)
+    
+    # Check if rule already exists
+    if old_text.casefold() in cached.old_keys:
+        await update.message.reply_text(
+            f"❌ Rule for '{old_text}' already exists. Use edit to modify it."
+        )
+        return
+    
+    replace_rules = list(cached.rules)
+    
+    # Add new rule
+    new_rule = {
+        'old': old_text,
+        'new': new_text,
+        'enabled': True,
+        'case_sensitive': False
+    }
+    replace_rules.append(new_rule)
+    
+    # Save to database
+    _save_rules(user_id, replace_rules, {'op': 'add', 'rule': new_rule})
+    
+    success_text = f"✅ **Replacement Rule Added**\n\n"
+    success_text += f"**Replace:** `{old_text}`\n"
+    success_text += f"**With:** `{new_text}`\n\n"
+    success_text += "This rule will be applied to all future file uploads."
+    
+    await update.message.reply_text(
+        success_text,
+        parse_mode="Markdown",
+        reply_markup=_RULE_ADDED_KB
+    )
+    
+    logger.info(f"User {user_id} added replace rule: {old_text} → {new_text}")
+
+@safe_handler("deleting replace rule", "❌ Error deleting rule.")
+async def delete_replace_rule(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, rule_index: int):
+    """Delete a replacement rule"""
+    replace_rules = list(await _get_rules(user_id))
+    
+    if 0 <= rule_index < len(replace_rules):
+        deleted_rule = replace_rules.pop(rule_index)
         
         # Save to database
-        await db.update_user_settings(user_id, {
-            'replace_rules': json.dumps(replace_rules)
-        })
+        _save_rules(user_id, replace_rules, {'op': 'delete', 'old': deleted_rule['old']})
         
-        success_text = f"✅ **Replacement Rule Added**\n\n"
-        success_text += f"**Replace:** `{old_text}`\n"
-        success_text += f"**With:** `{new_text}`\n\n"
-        success_text += "This rule will be applied to all future file uploads."
+        success_text = f"✅ **Rule Deleted**\n\n"
+        success_text += f"Removed rule: `{deleted_rule['old']}` → `{deleted_rule['new']}`"
         
-        keyboard = [
-            [InlineKeyboardButton("🔄 Preview", callback_data="replace_preview")],
-            [InlineKeyboardButton("🏠 Back to Settings", callback_data="settings_main")]
-        ]
+        await _edit_view(update, context, success_text, _BACK_KB)
         
-        await update.message.reply_text(
-            success_text,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+        logger.info(f"User {user_id} deleted replace rule: {deleted_rule['old']} → {deleted_rule['new']}")
+    else:
+        await _edit_out_of_view(update, context, "❌ Invalid rule index.")
+
+@safe_handler("toggling replace rule", "❌ Error toggling rule.")
+async def toggle_replace_rule(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, rule_index: int):
+    """Enable or disable a replacement rule"""
+    replace_rules = list(await _get_rules(user_id))
+    
+    if 0 <= rule_index < len(replace_rules):
+        rule = dict(replace_rules[rule_index])
+        rule['enabled'] = not rule.get('enabled', True)
+        replace_rules[rule_index] = rule
+        
+        # Save to database
+        _save_rules(
+            user_id,
+            replace_rules,
+            {'op': 'set_enabled', 'old': rule['old'], 'enabled': rule['enabled']}
         )
         
-        logger.info(f"User {user_id} added replace rule: {old_text} → {new_text}")
+        logger.info(f"User {user_id} toggled replace rule: {rule['old']} → {rule['new']}")
         
-    except Exception as e:
-        logger.error(f"Error adding replace rule: {e}")
-        await update.message.reply_text("❌ Error adding replacement rule.")
+        await show_edit_replace_rules(update, context, user_id)
+    else:
+        await _edit_out_of_view(update, context, "❌ Invalid rule index.")
 
-async def delete_replace_rule(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, rule_index: int):
-    """Delete a replacement rule"""
-    try:
-        settings = await db.get_user_settings(user_id)
-        replace_rules = json.loads(getattr(settings, 'replace_rules', '[]'))
-        
-        if 0 <= rule_index < len(replace_rules):
-            deleted_rule = replace_rules.pop(rule_index)
-            
-            # Save to database
-            await db.update_user_settings(user_id, {
-                'replace_rules': json.dumps(replace_rules)
-            })
-            
-            success_text = f"✅ **Rule Deleted**\n\n"
-            success_text += f"Removed rule: `{deleted_rule['old']}` → `{deleted_rule['new']}`"
-            
-            keyboard = [
-                [InlineKeyboardButton("🔙 Back to Rules", callback_data="replace_edit")]
-            ]
-            
-            await update.callback_query.edit_message_text(
-                success_text,
-                parse_mode="Markdown",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-            
-            logger.info(f"User {user_id} deleted replace rule: {deleted_rule['old']} → {deleted_rule['new']}")
+# replace_callback routing: exact callback data -> menu handler
+_CB_MENU_ACTIONS = {
+    "replace_add": show_add_replace_rule,
+    "replace_edit": show_edit_replace_rules,
+    "replace_preview": show_replace_preview,
+    "replace_settings": show_replace_settings,
+}
+
+# replace_callback routing: callback data minus its "_<index>" suffix -> rule handler
+_CB_RULE_ACTIONS = {
+    "replace_delete": delete_replace_rule,
+    "replace_toggle": toggle_replace_rule,
+}
+
+def _build_regex_substitute(replacements: Dict[str, str], case_sensitive: bool):
+    """Build a substitute function backed by a single regex alternation"""
+    # One capture group per rule, so a match resolves its replacement by group
+    # index; case-insensitive matches need not lowercase back to the rule key
+    # (e.g. 'İ' matches 'i' but lowercases to 'i̇')
+    old_texts = sorted(replacements, key=len, reverse=True)
+    new_texts = [None] + [replacements[old_text] for old_text in old_texts]
+    alternation = "|".join(f"({re.escape(old_text)})" for old_text in old_texts)
+
+    pattern = re.compile(alternation, 0 if case_sensitive else re.IGNORECASE)
+    return lambda text: pattern.sub(lambda m: new_texts[m.lastindex], text)
+
+def _build_automaton_substitute(replacements: Dict[str, str], case_sensitive: bool):
+    """Build a substitute function backed by an Aho-Corasick automaton"""
+    automaton = ahocorasick.Automaton()
+    for old_text, new_text in replacements.items():
+        automaton.add_word(old_text, (len(old_text), new_text))
+    automaton.make_automaton()
+
+    # Lowercasing can change string length for some characters, which would
+    # shift match offsets; such filenames go through the regex path instead
+    fallback = None if case_sensitive else _build_regex_substitute(replacements, False)
+
+    def substitute(text: str) -> str:
+        haystack = text if case_sensitive else text.lower()
+        if len(haystack) != len(text):
+            return fallback(text)
+
+        parts = []
+        position = 0
+        for end, (length, new_text) in automaton.iter_long(haystack):
+            parts.append(text[position:end - length + 1])
+            parts.append(new_text)
+            position = end + 1
+
+        if not parts:
+            return text
+
+        parts.append(text[position:])
+        return "".join(parts)
+
+    return substitute
+
+def _build_translate_substitute(replacements: Dict[str, str]):
+    """Build a substitute function backed by a str.translate table"""
+    table = str.maketrans(replacements)
+    return lambda text: text.translate(table)
+
+def _is_translatable(replacements: Dict[str, str], case_sensitive: bool) -> bool:
+    """Check whether every rule maps a single character that has no case variants"""
+    return all(
+        len(old_text) == 1 and (case_sensitive or old_text.lower() == old_text.upper())
+        for old_text in replacements
+    )
+
+@functools.lru_cache(maxsize=1024)
+def _compile_rules(rules: tuple) -> tuple:
+    """Compile a hashable ruleset into one substitute function per case mode
+
+    Single-character rules (like '.' -> ' ') become one str.translate
+    table. Large rulesets use an Aho-Corasick automaton when pyahocorasick
+    is installed, otherwise a regex alternation. Both replace the longest
+    match at each position.
+    """
+    compiled = []
+
+    for case_sensitive in (True, False):
+        replacements = {}
+        for old_text, new_text, enabled, rule_case_sensitive in rules:
+            if not enabled or not old_text or rule_case_sensitive != case_sensitive:
+                continue
+            key = old_text if case_sensitive else old_text.lower()
+            replacements.setdefault(key, new_text)
+
+        if not replacements:
+            continue
+
+        if _is_translatable(replacements, case_sensitive):
+            compiled.append(_build_translate_substitute(replacements))
+        elif ahocorasick is not None and len(replacements) > _AHOCORASICK_MIN_RULES:
+            compiled.append(_build_automaton_substitute(replacements, case_sensitive))
         else:
-            await update.callback_query.edit_message_text("❌ Invalid rule index.")
-            
-    except Exception as e:
-        logger.error(f"Error deleting replace rule: {e}")
-        await update.callback_query.edit_message_text("❌ Error deleting rule.")
+            compiled.append(_build_regex_substitute(replacements, case_sensitive))
+
+    return tuple(compiled)
 
-def apply_replace_rules(filename: str, replace_rules: List[Dict[str, Any]]) -> str:
-    """Apply replacement rules to filename"""
+def apply_replace_rules(filename: str, replace_rules: List[Dict[str, Any]], enabled: bool = True) -> str:
+    """Apply replacement rules to filename
+
+    Callers pass is_replace_mode_enabled(settings) as enabled; when it is
+    False the filename is returned without looking at the rules.
+    """
     try:
+        if not enabled or not replace_rules:
+            return filename
+
+        enabled_rules = [rule for rule in replace_rules if rule.get('enabled', True)]
+        if not enabled_rules:
+            return filename
+
+        # Most users have a single rule; a case-sensitive one is a plain str.replace
+        if len(enabled_rules) == 1 and enabled_rules[0].get('case_sensitive', False):
+            old_text = enabled_rules[0]['old']
+            return filename.replace(old_text, enabled_rules[0]['new']) if old_text else filename
+
+        rules = tuple(
+            (rule['old'], rule['new'], True, rule.get('case_sensitive', False))
+            for rule in enabled_rules
+        )
+
         result = filename
-        
-        for rule in replace_rules:
-            if not rule.get('enabled', True):
-                continue
-                
-            old_text = rule['old']
-            new_text = rule['new']
-            case_sensitive = rule.get('case_sensitive', False)
-            
-            if case_sensitive:
-                result = result.replace(old_text, new_text)
-            else:
-                # Case-insensitive replacement
-                import re
-                result = re.sub(re.escape(old_text), new_text, result, flags=re.IGNORECASE)
-        
-        return result
-        
+
+        for substitute in _compile_rules(rules):
+            result = substitute(result)
+
+        # Hand back the caller's object when no rule matched; str.translate
+        # always builds a new string even when nothing was mapped
+        return filename if result == filename else result
+
     except Exception as e:
         logger.error(f"Error applying replace rules: {e}")
         return filename
 
+@safe_handler("handling replace mode input", "❌ Error processing replacement rule.")
 async def handle_replace_mode_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle text input for replacement rules"""
-    try:
-        user_data = context.user_data
+    user_data = context.user_data
+    
+    if user_data.get('waiting_for_replace_old'):
+        # First message - old text
+        old_text = update.message.text.strip()
+        user_data['replace_old_text'] = old_text
+        user_data['waiting_for_replace_old'] = False
+        user_data['waiting_for_replace_new'] = True
         
-        if user_data.get('waiting_for_replace_old'):
-            # First message - old text
-            old_text = update.message.text.strip()
-            user_data['replace_old_text'] = old_text
-            user_data['waiting_for_replace_old'] = False
-            user_data['waiting_for_replace_new'] = True
-            
-            await update.message.reply_text(
-                f"✅ **Old text:** `{old_text}`\n\n"
-                f"Now send the replacement text:"
-            )
-            
-        elif user_data.get('waiting_for_replace_new'):
-            # Second message - new text
-            new_text = update.message.text.strip()
-            old_text = user_data.get('replace_old_text', '')
-            
-            user_data['waiting_for_replace_new'] = False
-            user_data.pop('replace_old_text', None)
-            
-            await add_replace_rule(update, context, update.effective_user.id, old_text, new_text)
-            
-    except Exception as e:
-        logger.error(f"Error handling replace mode input: {e}")
-        await update.message.reply_text("❌ Error processing replacement rule.")
+        await update.message.reply_text(
+            f"✅ **Old text:** `{old_text}`\n\n"
+            f"Now send the replacement text:"
+        )
+        
+    elif user_data.get('waiting_for_replace_new'):
+        # Second message - new text
+        new_text = update.message.text.strip()
+        old_text = user_data.get('replace_old_text', '')
+        
+        user_data['waiting_for_replace_new'] = False
+        user_data.pop('replace_old_text', None)
+        
+        await add_replace_rule(update, context, update.effective_user.id, old_text, new_text)
 
 def get_user_replace_rules(user_settings) -> List[Dict[str, Any]]:
     """Get user's replacement rules"""
     try:
-        return json.loads(getattr(user_settings, 'replace_rules', '[]'))
+        replace_rules = getattr(user_settings, 'replace_rules', None) or []
+        # Rules saved before the array migration are a JSON string
+        if isinstance(replace_rules, str):
+            return _loads(replace_rules)
+        return replace_rules
     except:
         return []
 
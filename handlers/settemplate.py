@@ -2,7 +2,9 @@
 Set template command handler
 """
 
+import functools
 import logging
+from typing import NamedTuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
@@ -65,6 +67,206 @@ TEMPLATE_PRESETS = {
     }
 }
 
+class _PresetRow(NamedTuple):
+    """Flat view of one TEMPLATE_PRESETS entry"""
+    key: str
+    name: str
+    template: str
+    description: str
+    example: str
+
+# Presets in menu order, for building menus and lookup tables
+_TEMPLATE_PRESETS_LIST = tuple(
+    _PresetRow(key, info['name'], info['template'], info['description'], info['example'])
+    for key, info in TEMPLATE_PRESETS.items()
+)
+
+@functools.lru_cache(maxsize=512)
+def _get_parser(template: str) -> TemplateParser:
+    """Get a shared TemplateParser for a template string"""
+    return TemplateParser(template)
+
+# Warm the parser cache with the presets
+for _preset in _TEMPLATE_PRESETS_LIST:
+    _get_parser(_preset.template)
+
+@functools.lru_cache(maxsize=256)
+def _preview(template: str, filename: str) -> str:
+    """Render a filename through a template, memoized for the fixed demo samples"""
+    return _get_parser(template).parse(filename)
+
+@functools.lru_cache(maxsize=256)
+def _template_error_text(template: str, error: str) -> str:
+    """Render the error reply for a template that failed to parse"""
+    return (
+        "❌ **Template Error**\n\n"
+        f"Template: `{template}`\n"
+        f"Error: {error}\n\n"
+        "Please check your template syntax and try again."
+    )
+
+def _render_preview_lines(template: str, sample_files) -> str:
+    """Render '• sample → preview' lines for a template"""
+    parts = []
+    for sample in sample_files:
+        try:
+            parts.append(f"• `{sample}`\n  → `{_preview(template, sample)}`\n\n")
+        except Exception as e:
+            parts.append(f"• `{sample}`\n  → Error: {e}\n\n")
+    return "".join(parts)
+
+# Sample files shown on the preset confirmation screen
+_PRESET_SAMPLE_FILES = (
+    "Game.of.Thrones.S01E01.1080p.BluRay.x264-GROUP.mkv",
+    "The.Dark.Knight.2008.1080p.BluRay.x264-SPARKS.mkv",
+    "Document.Name.2024.pdf"
+)
+
+_PRESET_PREVIEW_LINES = {
+    preset.key: _render_preview_lines(preset.template, _PRESET_SAMPLE_FILES)
+    for preset in _TEMPLATE_PRESETS_LIST
+}
+
+# Static keyboards, built once at import time
+_TEMPLATE_MENU_KB = InlineKeyboardMarkup(
+    [
+        [InlineKeyboardButton(
+            f"📋 {preset.name}",
+            callback_data=f"template_preset_{preset.key}"
+        )]
+        for preset in _TEMPLATE_PRESETS_LIST
+    ] + [
+        [
+            InlineKeyboardButton("✏️ Custom Template", callback_data="template_custom"),
+            InlineKeyboardButton("🔄 Test Template", callback_data="template_test")
+        ],
+        [
+            InlineKeyboardButton("📚 Variables Help", callback_data="template_variables"),
+            InlineKeyboardButton("🏠 Back", callback_data="settings_main")
+        ]
+    ]
+)
+
+_PRESET_CONFIRM_KB = {
+    preset.key: InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ Apply Template", callback_data=f"template_confirm_{preset.key}")],
+        [InlineKeyboardButton("🔙 Back to Templates", callback_data="template_main")]
+    ])
+    for preset in _TEMPLATE_PRESETS_LIST
+}
+
+_TEMPLATE_APPLIED_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔄 Preview", callback_data="template_test")],
+    [InlineKeyboardButton("⚡ Enable Auto-Rename", callback_data="autorename_enable")],
+    [InlineKeyboardButton("🏠 Back to Settings", callback_data="settings_main")]
+])
+
+_CUSTOM_INPUT_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📚 More Variables", callback_data="template_variables")],
+    [InlineKeyboardButton("🔙 Back", callback_data="template_main")]
+])
+
+_TEMPLATE_TEST_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✏️ Test Custom File", callback_data="template_test_custom")],
+    [InlineKeyboardButton("📝 Edit Template", callback_data="template_custom")],
+    [InlineKeyboardButton("🔙 Back", callback_data="template_main")]
+])
+
+_VARIABLES_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📝 Try Custom Template", callback_data="template_custom")],
+    [InlineKeyboardButton("🔄 Test Template", callback_data="template_test")],
+    [InlineKeyboardButton("🔙 Back", callback_data="template_main")]
+])
+
+# Static message blocks, built once at import time
+_TEMPLATE_MENU_PRESETS_BLOCK = "**Available Templates:**\n"
+
+_PRESET_CONFIRM_PREFIX = {
+    preset.key: (
+        f"📋 **{preset.name} Template**\n\n"
+        f"**Template:** `{preset.template}`\n"
+        f"**Description:** {preset.description}\n"
+        f"**Example:** `{preset.example}`\n\n"
+    )
+    for preset in _TEMPLATE_PRESETS_LIST
+}
+
+# Full preset confirmation screens, sample previews included
+_PRESET_CONFIRM_TEXT = {
+    preset.key: (
+        f"{_PRESET_CONFIRM_PREFIX[preset.key]}"
+        "**Preview with sample files:**\n"
+        f"{_PRESET_PREVIEW_LINES[preset.key]}"
+        "**Apply this template?**"
+    )
+    for preset in _TEMPLATE_PRESETS_LIST
+}
+
+_CUSTOM_INPUT_TEXT = (
+    "✏️ **Custom Template Input**\n\n"
+    "Create your own rename template using variables:\n\n"
+    "**Available Variables:**\n"
+    "• `{title}` - Original filename without extension\n"
+    "• `{season}` - Season number (S01, S02, etc.)\n"
+    "• `{episode}` - Episode number (E01, E02, etc.)\n"
+    "• `{year}` - Year (2024, 2025, etc.)\n"
+    "• `{quality}` - Quality (1080p, 720p, etc.)\n"
+    "• `{codec}` - Video codec (x264, x265, etc.)\n"
+    "• `{source}` - Source (BluRay, WEB-DL, etc.)\n"
+    "• `{group}` - Release group name\n"
+    "• `{extension}` - File extension\n\n"
+    "**Example Templates:**\n"
+    "• `{title} - {season}{episode}`\n"
+    "• `{title} ({year}) [{quality}]`\n"
+    "• `{title} - {season}{episode} - {quality}`\n"
+    "• `[{group}] {title} - {season}{episode}`\n"
+    "• `{title}.{year}.{quality}.{codec}`\n\n"
+    "**Send your custom template now:**"
+)
+
+_NEXT_STEPS_TEXT = (
+    "**Next steps:**\n"
+    "• Upload files to test the template\n"
+    "• Use /preview to see more examples\n"
+    "• Enable auto-rename with /autorename"
+)
+
+_CUSTOM_SET_FOOTER = "Your custom template has been applied successfully!\n\n" + _NEXT_STEPS_TEXT
+
+_VARIABLES_TEXT = (
+    "📚 **Template Variables Reference**\n\n"
+    "Complete list of available variables:\n\n"
+    "**📁 Basic Variables:**\n"
+    "• `{title}` - Original filename without extension\n"
+    "• `{extension}` - File extension (.mkv, .mp4, etc.)\n"
+    "• `{filename}` - Full original filename\n\n"
+    "**📺 TV Show Variables:**\n"
+    "• `{season}` - Season number (S01, S02, etc.)\n"
+    "• `{episode}` - Episode number (E01, E02, etc.)\n"
+    "• `{series}` - Series name\n\n"
+    "**🎬 Movie Variables:**\n"
+    "• `{year}` - Release year (2024, 2025, etc.)\n"
+    "• `{movie}` - Movie title\n\n"
+    "**🎥 Quality Variables:**\n"
+    "• `{quality}` - Video quality (1080p, 720p, etc.)\n"
+    "• `{resolution}` - Resolution (1920x1080, etc.)\n"
+    "• `{codec}` - Video codec (x264, x265, etc.)\n"
+    "• `{source}` - Source (BluRay, WEB-DL, HDTV, etc.)\n\n"
+    "**🏷️ Metadata Variables:**\n"
+    "• `{group}` - Release group name\n"
+    "• `{language}` - Language code\n"
+    "• `{audio}` - Audio codec/info\n\n"
+    "**📅 Date Variables:**\n"
+    "• `{date}` - Current date (YYYY-MM-DD)\n"
+    "• `{time}` - Current time (HH:MM)\n"
+    "• `{timestamp}` - Unix timestamp\n\n"
+    "**💡 Tips:**\n"
+    "• Use `-` or `_` as separators\n"
+    "• Variables are case-sensitive\n"
+    "• Unknown variables are left as-is\n"
+    "• Test your template before applying\n"
+)
+
 @require_auth
 @subscription_required
 async def settemplate_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -80,7 +282,7 @@ async def settemplate_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             # Show template selection menu
             await show_template_menu(update, context, user_id)
     except Exception as e:
-        logger.error(f"Error in settemplate command: {e}")
+        logger.error("Error in settemplate command: %s", e)
         await update.message.reply_text(
             "❌ An error occurred while setting template."
         )
@@ -88,60 +290,38 @@ async def settemplate_command(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def show_template_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Show template selection menu"""
     try:
-        settings = await db.get_user_settings(user_id)
-        current_template = getattr(settings, 'rename_template', '{title}')
-        
-        message_text = "📝 **Set Rename Template**\n\n"
-        message_text += "Choose a template for automatic file renaming:\n\n"
-        
-        message_text += f"**Current Template:** `{current_template}`\n"
+        current_template = await db.get_rename_template(user_id)
         
         # Show preview with current template
         sample_file = "Game.of.Thrones.S01E01.1080p.BluRay.x264-GROUP.mkv"
         try:
-            parser = TemplateParser(current_template)
-            preview = parser.parse(sample_file)
-            message_text += f"**Preview:** `{preview}`\n\n"
+            preview_line = f"**Preview:** `{_preview(current_template, sample_file)}`\n\n"
         except:
-            message_text += f"**Preview:** Error parsing template\n\n"
-        
-        message_text += "**Available Templates:**\n"
-        
-        keyboard = []
-        for preset_key, preset_info in TEMPLATE_PRESETS.items():
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"📋 {preset_info['name']}", 
-                    callback_data=f"template_preset_{preset_key}"
-                )
-            ])
-        
-        keyboard.append([
-            InlineKeyboardButton("✏️ Custom Template", callback_data="template_custom"),
-            InlineKeyboardButton("🔄 Test Template", callback_data="template_test")
-        ])
-        keyboard.append([
-            InlineKeyboardButton("📚 Variables Help", callback_data="template_variables"),
-            InlineKeyboardButton("🏠 Back", callback_data="settings_main")
-        ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+            preview_line = "**Preview:** Error parsing template\n\n"
+        
+        message_text = (
+            "📝 **Set Rename Template**\n\n"
+            "Choose a template for automatic file renaming:\n\n"
+            f"**Current Template:** `{current_template}`\n"
+            f"{preview_line}"
+            f"{_TEMPLATE_MENU_PRESETS_BLOCK}"
+        )
         
         if update.message:
             await update.message.reply_text(
                 message_text,
                 parse_mode="Markdown",
-                reply_markup=reply_markup
+                reply_markup=_TEMPLATE_MENU_KB
             )
         else:
             await update.callback_query.edit_message_text(
                 message_text,
                 parse_mode="Markdown",
-                reply_markup=reply_markup
+                reply_markup=_TEMPLATE_MENU_KB
             )
             
     except Exception as e:
-        logger.error(f"Error showing template menu: {e}")
+        logger.error("Error showing template menu: %s", e)
         await update.message.reply_text("❌ Error loading template menu.")
 
 async def template_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -153,79 +333,47 @@ async def template_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = query.data
     
     try:
-        if data.startswith("template_preset_"):
-            preset = data.replace("template_preset_", "")
-            await set_preset_template(update, context, user_id, preset)
-        elif data == "template_custom":
-            await show_custom_template_input(update, context, user_id)
-        elif data == "template_test":
-            await show_template_test(update, context, user_id)
-        elif data == "template_variables":
-            await show_template_variables(update, context, user_id)
-        elif data.startswith("template_confirm_"):
-            preset = data.replace("template_confirm_", "")
-            await confirm_preset_template(update, context, user_id, preset)
+        handler = _CALLBACK_ROUTES.get(data)
+        if handler:
+            await handler(update, context, user_id)
+            return
+        
+        for prefix, handler in _PREFIX_ROUTES:
+            if data.startswith(prefix):
+                await handler(update, context, user_id, data[len(prefix):])
+                break
             
     except Exception as e:
-        logger.error(f"Error handling template callback: {e}")
+        logger.error("Error handling template callback: %s", e)
         await query.edit_message_text("❌ Error processing template settings.")
 
 async def set_preset_template(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, preset: str):
     """Set a preset template"""
+    edit = update.callback_query.edit_message_text
+    
     try:
         if preset not in TEMPLATE_PRESETS:
-            await update.callback_query.edit_message_text("❌ Invalid template preset.")
+            await edit("❌ Invalid template preset.")
             return
         
-        preset_info = TEMPLATE_PRESETS[preset]
-        template = preset_info['template']
-        
         # Show confirmation with preview
-        confirm_text = f"📋 **{preset_info['name']} Template**\n\n"
-        confirm_text += f"**Template:** `{template}`\n"
-        confirm_text += f"**Description:** {preset_info['description']}\n"
-        confirm_text += f"**Example:** `{preset_info['example']}`\n\n"
-        
-        # Show preview with sample files
-        sample_files = [
-            "Game.of.Thrones.S01E01.1080p.BluRay.x264-GROUP.mkv",
-            "The.Dark.Knight.2008.1080p.BluRay.x264-SPARKS.mkv",
-            "Document.Name.2024.pdf"
-        ]
-        
-        confirm_text += "**Preview with sample files:**\n"
-        parser = TemplateParser(template)
-        for sample in sample_files:
-            try:
-                preview = parser.parse(sample)
-                confirm_text += f"• `{sample}`\n"
-                confirm_text += f"  → `{preview}`\n\n"
-            except Exception as e:
-                confirm_text += f"• `{sample}`\n"
-                confirm_text += f"  → Error: {str(e)}\n\n"
-        
-        confirm_text += "**Apply this template?**"
-        
-        keyboard = [
-            [InlineKeyboardButton("✅ Apply Template", callback_data=f"template_confirm_{preset}")],
-            [InlineKeyboardButton("🔙 Back to Templates", callback_data="template_main")]
-        ]
-        
-        await update.callback_query.edit_message_text(
-            confirm_text,
+        await edit(
+            _PRESET_CONFIRM_TEXT[preset],
             parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=_PRESET_CONFIRM_KB[preset]
         )
         
     except Exception as e:
-        logger.error(f"Error setting preset template: {e}")
-        await update.callback_query.edit_message_text("❌ Error setting preset template.")
+        logger.error("Error setting preset template: %s", e)
+        await edit("❌ Error setting preset template.")
 
 async def confirm_preset_template(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, preset: str):
     """Confirm and apply preset template"""
+    edit = update.callback_query.edit_message_text
+    
     try:
         if preset not in TEMPLATE_PRESETS:
-            await update.callback_query.edit_message_text("❌ Invalid template preset.")
+            await edit("❌ Invalid template preset.")
             return
         
         preset_info = TEMPLATE_PRESETS[preset]
@@ -234,87 +382,51 @@ async def confirm_preset_template(update: Update, context: ContextTypes.DEFAULT_
         # Update user settings
         await db.update_user_settings(user_id, {"rename_template": template})
         
-        success_text = f"✅ **Template Applied Successfully**\n\n"
-        success_text += f"**Template:** `{template}`\n"
-        success_text += f"**Type:** {preset_info['name']}\n"
-        success_text += f"**Description:** {preset_info['description']}\n\n"
-        success_text += "This template will be used for all future automatic renames.\n\n"
-        success_text += "**Next steps:**\n"
-        success_text += "• Upload files to test the template\n"
-        success_text += "• Use /preview to see more examples\n"
-        success_text += "• Enable auto-rename with /autorename"
-        
-        keyboard = [
-            [InlineKeyboardButton("🔄 Preview", callback_data="template_test")],
-            [InlineKeyboardButton("⚡ Enable Auto-Rename", callback_data="autorename_enable")],
-            [InlineKeyboardButton("🏠 Back to Settings", callback_data="settings_main")]
-        ]
+        success_text = (
+            "✅ **Template Applied Successfully**\n\n"
+            f"**Template:** `{template}`\n"
+            f"**Type:** {preset_info['name']}\n"
+            f"**Description:** {preset_info['description']}\n\n"
+            "This template will be used for all future automatic renames.\n\n"
+            f"{_NEXT_STEPS_TEXT}"
+        )
         
-        await update.callback_query.edit_message_text(
+        await edit(
             success_text,
             parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=_TEMPLATE_APPLIED_KB
         )
         
-        logger.info(f"User {user_id} set template to: {template}")
+        logger.info("User %s set template to: %s", user_id, template)
         
     except Exception as e:
-        logger.error(f"Error confirming preset template: {e}")
-        await update.callback_query.edit_message_text("❌ Error applying template.")
+        logger.error("Error confirming preset template: %s", e)
+        await edit("❌ Error applying template.")
 
 async def show_custom_template_input(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Show custom template input interface"""
+    edit = update.callback_query.edit_message_text
+    
     try:
-        custom_text = "✏️ **Custom Template Input**\n\n"
-        custom_text += "Create your own rename template using variables:\n\n"
-        
-        custom_text += "**Available Variables:**\n"
-        custom_text += "• `{title}` - Original filename without extension\n"
-        custom_text += "• `{season}` - Season number (S01, S02, etc.)\n"
-        custom_text += "• `{episode}` - Episode number (E01, E02, etc.)\n"
-        custom_text += "• `{year}` - Year (2024, 2025, etc.)\n"
-        custom_text += "• `{quality}` - Quality (1080p, 720p, etc.)\n"
-        custom_text += "• `{codec}` - Video codec (x264, x265, etc.)\n"
-        custom_text += "• `{source}` - Source (BluRay, WEB-DL, etc.)\n"
-        custom_text += "• `{group}` - Release group name\n"
-        custom_text += "• `{extension}` - File extension\n\n"
-        
-        custom_text += "**Example Templates:**\n"
-        custom_text += "• `{title} - {season}{episode}`\n"
-        custom_text += "• `{title} ({year}) [{quality}]`\n"
-        custom_text += "• `{title} - {season}{episode} - {quality}`\n"
-        custom_text += "• `[{group}] {title} - {season}{episode}`\n"
-        custom_text += "• `{title}.{year}.{quality}.{codec}`\n\n"
-        
-        custom_text += "**Send your custom template now:**"
-        
-        keyboard = [
-            [InlineKeyboardButton("📚 More Variables", callback_data="template_variables")],
-            [InlineKeyboardButton("🔙 Back", callback_data="template_main")]
-        ]
-        
-        await update.callback_query.edit_message_text(
-            custom_text,
+        await edit(
+            _CUSTOM_INPUT_TEXT,
             parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=_CUSTOM_INPUT_KB
         )
         
         # Set state for text input
         context.user_data['waiting_for_custom_template'] = True
         
     except Exception as e:
-        logger.error(f"Error showing custom template input: {e}")
-        await update.callback_query.edit_message_text("❌ Error loading custom template input.")
+        logger.error("Error showing custom template input: %s", e)
+        await edit("❌ Error loading custom template input.")
 
 async def show_template_test(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Show template testing interface"""
+    edit = update.callback_query.edit_message_text
+    
     try:
-        settings = await db.get_user_settings(user_id)
-        current_template = getattr(settings, 'rename_template', '{title}')
-        
-        test_text = "🔄 **Template Testing**\n\n"
-        test_text += f"**Current Template:** `{current_template}`\n\n"
-        test_text += "**Test Results:**\n"
+        current_template = await db.get_rename_template(user_id)
         
         # Test with various sample files
         test_files = [
@@ -325,141 +437,92 @@ async def show_template_test(update: Update, context: ContextTypes.DEFAULT_TYPE,
             "Artist.Name.Song.Title.320kbps.mp3"
         ]
         
-        parser = TemplateParser(current_template)
+        parts = [f"🔄 **Template Testing**\n\n**Current Template:** `{current_template}`\n\n**Test Results:**\n"]
         for test_file in test_files:
             try:
-                result = parser.parse(test_file)
-                test_text += f"• `{test_file}`\n"
-                test_text += f"  → `{result}`\n\n"
+                parts.append(f"• `{test_file}`\n  → `{_preview(current_template, test_file)}`\n\n")
             except Exception as e:
-                test_text += f"• `{test_file}`\n"
-                test_text += f"  → ❌ Error: {str(e)}\n\n"
+                parts.append(f"• `{test_file}`\n  → ❌ Error: {e}\n\n")
         
-        keyboard = [
-            [InlineKeyboardButton("✏️ Test Custom File", callback_data="template_test_custom")],
-            [InlineKeyboardButton("📝 Edit Template", callback_data="template_custom")],
-            [InlineKeyboardButton("🔙 Back", callback_data="template_main")]
-        ]
+        test_text = "".join(parts)
         
-        await update.callback_query.edit_message_text(
+        await edit(
             test_text,
             parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=_TEMPLATE_TEST_KB
         )
         
     except Exception as e:
-        logger.error(f"Error showing template test: {e}")
-        await update.callback_query.edit_message_text("❌ Error loading template test.")
+        logger.error("Error showing template test: %s", e)
+        await edit("❌ Error loading template test.")
 
 async def show_template_variables(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Show detailed template variables help"""
+    edit = update.callback_query.edit_message_text
+    
     try:
-        variables_text = "📚 **Template Variables Reference**\n\n"
-        variables_text += "Complete list of available variables:\n\n"
-        
-        variables_text += "**📁 Basic Variables:**\n"
-        variables_text += "• `{title}` - Original filename without extension\n"
-        variables_text += "• `{extension}` - File extension (.mkv, .mp4, etc.)\n"
-        variables_text += "• `{filename}` - Full original filename\n\n"
-        
-        variables_text += "**📺 TV Show Variables:**\n"
-        variables_text += "• `{season}` - Season number (S01, S02, etc.)\n"
-        variables_text += "• `{episode}` - Episode number (E01, E02, etc.)\n"
-        variables_text += "• `{series}` - Series name\n\n"
-        
-        variables_text += "**🎬 Movie Variables:**\n"
-        variables_text += "• `{year}` - Release year (2024, 2025, etc.)\n"
-        variables_text += "• `{movie}` - Movie title\n\n"
-        
-        variables_text += "**🎥 Quality Variables:**\n"
-        variables_text += "• `{quality}` - Video quality (1080p, 720p, etc.)\n"
-        variables_text += "• `{resolution}` - Resolution (1920x1080, etc.)\n"
-        variables_text += "• `{codec}` - Video codec (x264, x265, etc.)\n"
-        variables_text += "• `{source}` - Source (BluRay, WEB-DL, HDTV, etc.)\n\n"
-        
-        variables_text += "**🏷️ Metadata Variables:**\n"
-        variables_text += "• `{group}` - Release group name\n"
-        variables_text += "• `{language}` - Language code\n"
-        variables_text += "• `{audio}` - Audio codec/info\n\n"
-        
-        variables_text += "**📅 Date Variables:**\n"
-        variables_text += "• `{date}` - Current date (YYYY-MM-DD)\n"
-        variables_text += "• `{time}` - Current time (HH:MM)\n"
-        variables_text += "• `{timestamp}` - Unix timestamp\n\n"
-        
-        variables_text += "**💡 Tips:**\n"
-        variables_text += "• Use `-` or `_` as separators\n"
-        variables_text += "• Variables are case-sensitive\n"
-        variables_text += "• Unknown variables are left as-is\n"
-        variables_text += "• Test your template before applying\n"
-        
-        keyboard = [
-            [InlineKeyboardButton("📝 Try Custom Template", callback_data="template_custom")],
-            [InlineKeyboardButton("🔄 Test Template", callback_data="template_test")],
-            [InlineKeyboardButton("🔙 Back", callback_data="template_main")]
-        ]
-        
-        await update.callback_query.edit_message_text(
-            variables_text,
+        await edit(
+            _VARIABLES_TEXT,
             parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=_VARIABLES_KB
         )
         
     except Exception as e:
-        logger.error(f"Error showing template variables: {e}")
-        await update.callback_query.edit_message_text("❌ Error loading variables help.")
+        logger.error("Error showing template variables: %s", e)
+        await edit("❌ Error loading variables help.")
 
 async def set_custom_template(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, template: str):
     """Set a custom template"""
+    reply = update.message.reply_text
+    
     try:
         # Validate template
         if not template.strip():
-            await update.message.reply_text("❌ Template cannot be empty.")
+            await reply("❌ Template cannot be empty.")
             return
         
         # Test template with sample file
         test_file = "Sample.File.S01E01.1080p.BluRay.x264-GROUP.mkv"
         try:
-            parser = TemplateParser(template)
-            preview = parser.parse(test_file)
+            preview = _preview(template, test_file)
         except Exception as e:
-            await update.message.reply_text(
-                f"❌ **Template Error**\n\n"
-                f"Template: `{template}`\n"
-                f"Error: {str(e)}\n\n"
-                f"Please check your template syntax and try again."
-            )
+            await reply(_template_error_text(template, str(e)))
             return
         
         # Update user settings
         await db.update_user_settings(user_id, {"rename_template": template})
         
-        success_text = f"✅ **Custom Template Set**\n\n"
-        success_text += f"**Template:** `{template}`\n"
-        success_text += f"**Preview:** `{preview}`\n\n"
-        success_text += "Your custom template has been applied successfully!\n\n"
-        success_text += "**Next steps:**\n"
-        success_text += "• Upload files to test the template\n"
-        success_text += "• Use /preview to see more examples\n"
-        success_text += "• Enable auto-rename with /autorename"
-        
-        keyboard = [
-            [InlineKeyboardButton("🔄 Preview", callback_data="template_test")],
-            [InlineKeyboardButton("⚡ Enable Auto-Rename", callback_data="autorename_enable")],
-            [InlineKeyboardButton("🏠 Back to Settings", callback_data="settings_main")]
-        ]
+        success_text = (
+            "✅ **Custom Template Set**\n\n"
+            f"**Template:** `{template}`\n"
+            f"**Preview:** `{preview}`\n\n"
+            f"{_CUSTOM_SET_FOOTER}"
+        )
         
-        await update.message.reply_text(
+        await reply(
             success_text,
             parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=_TEMPLATE_APPLIED_KB
         )
         
-        logger.info(f"User {user_id} set custom template: {template}")
+        logger.info("User %s set custom template: %s", user_id, template)
         
     except Exception as e:
-        logger.error(f"Error setting custom template: {e}")
-        await update.message.reply_text("❌ Error setting custom template.")
+        logger.error("Error setting custom template: %s", e)
+        await reply("❌ Error setting custom template.")
+
+# template_callback routing: exact callback data -> handler
+_CALLBACK_ROUTES = {
+    "template_custom": show_custom_template_input,
+    "template_test": show_template_test,
+    "template_variables": show_template_variables,
+}
+
+# template_callback routing: callback data prefix -> handler taking the preset key
+_PREFIX_ROUTES = (
+    ("template_preset_", set_preset_template),
+    ("template_confirm_", confirm_preset_template),
+)
 
 async def handle_custom_template_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle custom template input from user"""
@@ -476,12 +539,12 @@ async def handle_custom_template_input(update: Update, context: ContextTypes.DEF
         await set_custom_template(update, context, user_id, template)
         
     except Exception as e:
-        logger.error(f"Error handling custom template input: {e}")
+        logger.error("Error handling custom template input: %s", e)
         await update.message.reply_text("❌ Error processing custom template.")
 
 def get_user_template(user_settings) -> str:
     """Get user's current template"""
-    return getattr(user_settings, 'rename_template', '{title}')
+    return user_settings.rename_template if user_settings else '{title}'
 
 def validate_template(template: str) -> tuple[bool, str]:
     """Validate template syntax"""
@@ -490,8 +553,7 @@ def validate_template(template: str) -> tuple[bool, str]:
             return False, "Template cannot be empty"
         
         # Test with sample file
-        parser = TemplateParser(template)
-        parser.parse("Sample.File.S01E01.1080p.BluRay.x264-GROUP.mkv")
+        _preview(template, "Sample.File.S01E01.1080p.BluRay.x264-GROUP.mkv")
         
         return True, "Template is valid"
         
@@ -2,6 +2,7 @@
 Settings handler for user configuration
 """
 
+import functools
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
@@ -11,39 +12,12 @@ from database.models import UserSettings
 
 logger = logging.getLogger(__name__)
 
-async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /settings command"""
-    user_id = update.effective_user.id
-    
-    try:
-        # Get user settings
-        settings = await db.get_user_settings(user_id)
-        if not settings:
-            settings = UserSettings(user_id=user_id)
-            await db.create_user_settings(settings)
-        
-        await show_settings_menu(update, context, settings)
-        
-    except Exception as e:
-        logger.error(f"Error in settings command: {e}")
-        await update.message.reply_text(
-            "❌ An error occurred while loading settings. Please try again."
-        )
-
-async def show_settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, settings: UserSettings):
-    """Show main settings menu"""
-    auto_rename_status = "✅ On" if settings.auto_rename else "❌ Off"
-    thumbnail_mode_status = "✅ On" if settings.thumbnail_mode else "❌ Off"
-    notifications_status = "✅ On" if settings.notification_enabled else "❌ Off"
-    
-    settings_text = f"""
+# Static menu texts, filled in with the user's current values on render
+_SETTINGS_TEXT = """
 ⚙️ **Bot Settings**
 
-📝 **Rename Template:** `{settings.rename_template}`
-⚡ **Auto Rename:** {auto_rename_status}
-🖼️ **Thumbnail Mode:** {thumbnail_mode_status}
-🔔 **Notifications:** {notifications_status}
-🎞️ **Quality Preference:** {settings.quality_preference.title()}
+📝 **Rename Template:** `{template}`
+🎞️ **Quality Preference:** {quality}
 
 💡 **Template Variables:**
 • `{{title}}` - Original filename
@@ -57,17 +31,132 @@ async def show_settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE,
 • `{{title}} ({{year}}) [{{quality}}]`
 • `Movie - {{title}} - {{year}}`
     """
-    
-    keyboard = [
+
+_TEMPLATE_SETTINGS_TEXT = """
+📝 **Rename Template Settings**
+
+**Current Template:** `{template}`
+
+Choose a template or send a custom one:
+
+🔤 **Available Variables:**
+• `{{title}}` - Original filename
+• `{{season}}` - Season (S01, S02, etc.)
+• `{{episode}}` - Episode (E01, E02, etc.)
+• `{{year}}` - Year (2024, 2025, etc.)
+• `{{quality}}` - Quality (1080p, 720p, etc.)
+
+📋 **Quick Templates:**
+    """
+
+_QUALITY_SETTINGS_TEXT = """
+🎞️ **Quality Preference Settings**
+
+**Current Setting:** {quality}
+
+Choose your preferred quality for processed files:
+
+📊 **Quality Options:**
+• **Original** - Keep original quality (recommended)
+• **High** - High quality (1080p)
+• **Medium** - Medium quality (720p)
+• **Low** - Low quality (480p)
+
+⚠️ **Note:** Lower quality settings will reduce file size but may affect visual quality.
+    """
+
+_ONOFF = {True: "✅ On", False: "❌ Off"}
+_QUALITY_LABEL = {"original": "Original", "high": "High", "medium": "Medium", "low": "Low"}
+
+# Quick templates offered by the template settings menu
+_QUICK_TEMPLATES = {
+    "basic": "{title}",
+    "series": "{title} - {season}{episode}",
+    "movie": "{title} ({year}) [{quality}]",
+    "detailed": "{title} - {season}{episode} - {quality}"
+}
+
+# Values written by "Reset to Default"; update_user_settings copies it, so it is never mutated
+_DEFAULT_SETTINGS = {
+    "rename_template": "{title}",
+    "auto_rename": False,
+    "thumbnail_mode": False,
+    "default_thumbnail": None,
+    "quality_preference": "original",
+    "auto_upload": False,
+    "notification_enabled": True
+}
+
+# Static keyboards
+_TEMPLATE_SETTINGS_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📄 Basic: {title}", callback_data="settings_template_basic")],
+    [InlineKeyboardButton("📺 Series: {title} - {season}{episode}", callback_data="settings_template_series")],
+    [InlineKeyboardButton("🎬 Movie: {title} ({year}) [{quality}]", callback_data="settings_template_movie")],
+    [InlineKeyboardButton("🎯 Detailed: {title} - {season}{episode} - {quality}", callback_data="settings_template_detailed")],
+    [InlineKeyboardButton("✏️ Custom Template", callback_data="settings_template_custom")],
+    [InlineKeyboardButton("⬅️ Back to Settings", callback_data="settings_main")]
+])
+
+_QUALITY_SETTINGS_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🎯 Original", callback_data="settings_quality_original")],
+    [InlineKeyboardButton("🔥 High", callback_data="settings_quality_high")],
+    [InlineKeyboardButton("⚡ Medium", callback_data="settings_quality_medium")],
+    [InlineKeyboardButton("💾 Low", callback_data="settings_quality_low")],
+    [InlineKeyboardButton("⬅️ Back to Settings", callback_data="settings_main")]
+])
+
+_BACK_KB = InlineKeyboardMarkup([[
+    InlineKeyboardButton("⬅️ Back to Settings", callback_data="settings_main")
+]])
+
+@functools.lru_cache(maxsize=8)
+def _settings_menu_kb(auto_rename: bool, thumbnail_mode: bool, notifications: bool) -> InlineKeyboardMarkup:
+    """Main settings keyboard with the current on/off state on each toggle button"""
+    return InlineKeyboardMarkup([
         [InlineKeyboardButton("📝 Change Template", callback_data="settings_template")],
-        [InlineKeyboardButton("⚡ Auto Rename", callback_data="settings_autorename")],
-        [InlineKeyboardButton("🖼️ Thumbnail Mode", callback_data="settings_thumbnail")],
+        [InlineKeyboardButton(f"⚡ Auto Rename: {_ONOFF[auto_rename]}", callback_data="settings_autorename")],
+        [InlineKeyboardButton(f"🖼️ Thumbnail Mode: {_ONOFF[thumbnail_mode]}", callback_data="settings_thumbnail")],
         [InlineKeyboardButton("🎞️ Quality", callback_data="settings_quality")],
-        [InlineKeyboardButton("🔔 Notifications", callback_data="settings_notifications")],
+        [InlineKeyboardButton(f"🔔 Notifications: {_ONOFF[notifications]}", callback_data="settings_notifications")],
         [InlineKeyboardButton("🔄 Reset to Default", callback_data="settings_reset")],
         [InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    ])
+
+def _build_main_kb(settings: UserSettings) -> InlineKeyboardMarkup:
+    """Main settings keyboard for the given settings"""
+    return _settings_menu_kb(
+        bool(settings.auto_rename), bool(settings.thumbnail_mode), bool(settings.notification_enabled)
+    )
+
+async def get_or_create_settings(user_id: int) -> UserSettings:
+    """Get user settings, creating the defaults on first use"""
+    settings = await db.get_user_settings(user_id)
+    if not settings:
+        settings = UserSettings(user_id=user_id)
+        await db.create_user_settings(settings)
+    return settings
+
+async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /settings command"""
+    user_id = update.effective_user.id
+    
+    try:
+        settings = await get_or_create_settings(user_id)
+        await show_settings_menu(update, context, settings)
+        
+    except Exception as e:
+        logger.error(f"Error in settings command: {e}")
+        await update.message.reply_text(
+            "❌ An error occurred while loading settings. Please try again."
+        )
+
+async def show_settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, settings: UserSettings):
+    """Show main settings menu"""
+    settings_text = _SETTINGS_TEXT.format(
+        template=settings.rename_template,
+        quality=_QUALITY_LABEL.get(settings.quality_preference, settings.quality_preference)
+    )
+    reply_markup = _build_main_kb(settings)
     
     if update.callback_query:
         await update.callback_query.edit_message_text(
@@ -88,95 +177,18 @@ async def settings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     user_id = update.effective_user.id
-    action = query.data.replace("settings_", "")
+    action = query.data.partition("_")[2]
     
     try:
-        settings = await db.get_user_settings(user_id)
-        if not settings:
-            settings = UserSettings(user_id=user_id)
-            await db.create_user_settings(settings)
-        
-        if action == "main":
-            await show_settings_menu(update, context, settings)
-        
-        elif action == "template":
-            await show_template_settings(update, context, settings)
-        
-        elif action == "autorename":
-            # Toggle auto rename
-            new_value = not settings.auto_rename
-            await db.update_user_settings(user_id, {"auto_rename": new_value})
-            
-            status = "enabled" if new_value else "disabled"
-            await query.edit_message_text(
-                f"✅ Auto rename has been {status}!",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Back to Settings", callback_data="settings_main")
-                ]])
-            )
-        
-        elif action == "thumbnail":
-            # Toggle thumbnail mode
-            new_value = not settings.thumbnail_mode
-            await db.update_user_settings(user_id, {"thumbnail_mode": new_value})
-            
-            status = "enabled" if new_value else "disabled"
-            await query.edit_message_text(
-                f"✅ Thumbnail mode has been {status}!",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Back to Settings", callback_data="settings_main")
-                ]])
-            )
-        
-        elif action == "quality":
-            await show_quality_settings(update, context, settings)
-        
-        elif action == "notifications":
-            # Toggle notifications
-            new_value = not settings.notification_enabled
-            await db.update_user_settings(user_id, {"notification_enabled": new_value})
-            
-            status = "enabled" if new_value else "disabled"
-            await query.edit_message_text(
-                f"✅ Notifications have been {status}!",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Back to Settings", callback_data="settings_main")
-                ]])
-            )
-        
-        elif action == "reset":
-            await reset_settings(update, context, user_id)
-        
-        elif action.startswith("quality_"):
-            quality = action.replace("quality_", "")
-            await db.update_user_settings(user_id, {"quality_preference": quality})
-            
-            await query.edit_message_text(
-                f"✅ Quality preference set to: {quality.title()}",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Back to Settings", callback_data="settings_main")
-                ]])
-            )
+        handler = _CALLBACK_ACTIONS.get(action)
+        if handler:
+            await handler(update, context, user_id)
+            return
         
-        elif action.startswith("template_"):
-            template_type = action.replace("template_", "")
-            templates = {
-                "basic": "{title}",
-                "series": "{title} - {season}{episode}",
-                "movie": "{title} ({year}) [{quality}]",
-                "detailed": "{title} - {season}{episode} - {quality}"
-            }
-            
-            if template_type in templates:
-                await db.update_user_settings(user_id, {"rename_template": templates[template_type]})
-                
-                await query.edit_message_text(
-                    f"✅ Template updated to: `{templates[template_type]}`",
-                    parse_mode="Markdown",
-                    reply_markup=InlineKeyboardMarkup([[
-                        InlineKeyboardButton("⬅️ Back to Settings", callback_data="settings_main")
-                    ]])
-                )
+        prefix, _, value = action.partition("_")
+        handler = _PREFIX_ACTIONS.get(prefix)
+        if handler:
+            await handler(update, context, user_id, value)
         
     except Exception as e:
         logger.error(f"Error in settings callback: {e}")
@@ -186,92 +198,34 @@ async def settings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_template_settings(update: Update, context: ContextTypes.DEFAULT_TYPE, settings: UserSettings):
     """Show template selection menu"""
-    template_text = f"""
-📝 **Rename Template Settings**
-
-**Current Template:** `{settings.rename_template}`
-
-Choose a template or send a custom one:
-
-🔤 **Available Variables:**
-• `{{title}}` - Original filename
-• `{{season}}` - Season (S01, S02, etc.)
-• `{{episode}}` - Episode (E01, E02, etc.)
-• `{{year}}` - Year (2024, 2025, etc.)
-• `{{quality}}` - Quality (1080p, 720p, etc.)
-
-📋 **Quick Templates:**
-    """
-    
-    keyboard = [
-        [InlineKeyboardButton("📄 Basic: {title}", callback_data="settings_template_basic")],
-        [InlineKeyboardButton("📺 Series: {title} - {season}{episode}", callback_data="settings_template_series")],
-        [InlineKeyboardButton("🎬 Movie: {title} ({year}) [{quality}]", callback_data="settings_template_movie")],
-        [InlineKeyboardButton("🎯 Detailed: {title} - {season}{episode} - {quality}", callback_data="settings_template_detailed")],
-        [InlineKeyboardButton("✏️ Custom Template", callback_data="settings_template_custom")],
-        [InlineKeyboardButton("⬅️ Back to Settings", callback_data="settings_main")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    template_text = _TEMPLATE_SETTINGS_TEXT.format(template=settings.rename_template)
     
     await update.callback_query.edit_message_text(
         template_text,
         parse_mode="Markdown",
-        reply_markup=reply_markup
+        reply_markup=_TEMPLATE_SETTINGS_KB
     )
 
 async def show_quality_settings(update: Update, context: ContextTypes.DEFAULT_TYPE, settings: UserSettings):
     """Show quality preference settings"""
-    quality_text = f"""
-🎞️ **Quality Preference Settings**
-
-**Current Setting:** {settings.quality_preference.title()}
-
-Choose your preferred quality for processed files:
-
-📊 **Quality Options:**
-• **Original** - Keep original quality (recommended)
-• **High** - High quality (1080p)
-• **Medium** - Medium quality (720p)
-• **Low** - Low quality (480p)
-
-⚠️ **Note:** Lower quality settings will reduce file size but may affect visual quality.
-    """
-    
-    keyboard = [
-        [InlineKeyboardButton("🎯 Original", callback_data="settings_quality_original")],
-        [InlineKeyboardButton("🔥 High", callback_data="settings_quality_high")],
-        [InlineKeyboardButton("⚡ Medium", callback_data="settings_quality_medium")],
-        [InlineKeyboardButton("💾 Low", callback_data="settings_quality_low")],
-        [InlineKeyboardButton("⬅️ Back to Settings", callback_data="settings_main")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    quality_text = _QUALITY_SETTINGS_TEXT.format(
+        quality=_QUALITY_LABEL.get(settings.quality_preference, settings.quality_preference)
+    )
     
     await update.callback_query.edit_message_text(
         quality_text,
         parse_mode="Markdown",
-        reply_markup=reply_markup
+        reply_markup=_QUALITY_SETTINGS_KB
     )
 
 async def reset_settings(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Reset user settings to default"""
     try:
-        default_settings = {
-            "rename_template": "{title}",
-            "auto_rename": False,
-            "thumbnail_mode": False,
-            "default_thumbnail": None,
-            "quality_preference": "original",
-            "auto_upload": False,
-            "notification_enabled": True
-        }
-        
-        await db.update_user_settings(user_id, default_settings)
+        await db.update_user_settings(user_id, _DEFAULT_SETTINGS)
         
         await update.callback_query.edit_message_text(
             "✅ Settings have been reset to default values!",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ Back to Settings", callback_data="settings_main")
-            ]])
+            reply_markup=_BACK_KB
         )
         
     except Exception as e:
@@ -279,3 +233,63 @@ async def reset_settings(update: Update, context: ContextTypes.DEFAULT_TYPE, use
         await update.callback_query.edit_message_text(
             "❌ An error occurred while resetting settings. Please try again."
         )
+
+async def _show_main(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+    """Show the main settings menu"""
+    await show_settings_menu(update, context, await get_or_create_settings(user_id))
+
+async def _show_template(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+    """Show the template settings menu"""
+    await show_template_settings(update, context, await get_or_create_settings(user_id))
+
+async def _show_quality(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+    """Show the quality settings menu"""
+    await show_quality_settings(update, context, await get_or_create_settings(user_id))
+
+async def _toggle_setting(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, field: str):
+    """Flip a boolean setting and show the new state on the menu buttons"""
+    settings = await db.toggle_user_setting(user_id, field)
+    if not settings:
+        raise RuntimeError(f"{field} toggle failed")
+    
+    await update.callback_query.edit_message_reply_markup(reply_markup=_build_main_kb(settings))
+
+async def _set_quality(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, quality: str):
+    """Store the chosen quality preference"""
+    await db.update_user_settings(user_id, {"quality_preference": quality})
+    
+    await update.callback_query.edit_message_text(
+        f"✅ Quality preference set to: {_QUALITY_LABEL.get(quality, quality)}",
+        reply_markup=_BACK_KB
+    )
+
+async def _set_template(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, template_type: str):
+    """Apply one of the quick templates"""
+    template = _QUICK_TEMPLATES.get(template_type)
+    if not template:
+        return
+    
+    await db.update_user_settings(user_id, {"rename_template": template})
+    
+    await update.callback_query.edit_message_text(
+        f"✅ Template updated to: `{template}`",
+        parse_mode="Markdown",
+        reply_markup=_BACK_KB
+    )
+
+# settings_callback routing: callback data minus "settings_" -> handler(update, context, user_id)
+_CALLBACK_ACTIONS = {
+    "main": _show_main,
+    "template": _show_template,
+    "quality": _show_quality,
+    "reset": reset_settings,
+    "autorename": functools.partial(_toggle_setting, field="auto_rename"),
+    "thumbnail": functools.partial(_toggle_setting, field="thumbnail_mode"),
+    "notifications": functools.partial(_toggle_setting, field="notification_enabled"),
+}
+
+# settings_callback routing for "<prefix>_<value>" actions -> handler(update, context, user_id, value)
+_PREFIX_ACTIONS = {
+    "quality": _set_quality,
+    "template": _set_template,
+}
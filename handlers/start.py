@@ -2,85 +2,37 @@
 Start command handler and basic bot information
 """
 
+import asyncio
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import time
+from typing import Optional
+from telegram import Update, User as TelegramUser, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from database.connection import db
-from database.models import User, UserSettings
-from utils.helpers import generate_referral_code, get_user_info
+from database.models import User, BotStats
+from utils.helpers import derive_referral_code, get_user_info
 from middleware.subscription_check import check_force_subscription
 
 logger = logging.getLogger(__name__)
 
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /start command"""
-    user = update.effective_user
-    chat_id = update.effective_chat.id
-    
-    try:
-        # Check if user exists in database
-        existing_user = await db.get_user(user.id)
-        
-        if not existing_user:
-            # Create new user
-            referral_code = generate_referral_code()
-            new_user = User(
-                user_id=user.id,
-                username=user.username,
-                first_name=user.first_name,
-                last_name=user.last_name,
-                language_code=user.language_code,
-                referral_code=referral_code
-            )
-            
-            # Handle referral if present
-            if context.args and context.args[0].startswith('ref_'):
-                referrer_code = context.args[0][4:]  # Remove 'ref_' prefix
-                referrer = await db.get_user_by_referral_code(referrer_code)
-                if referrer:
-                    new_user.referred_by = referrer.user_id
-                    # Grant referral bonus to referrer
-                    await db.update_user(referrer.user_id, {
-                        "is_premium": True,
-                        "premium_expires": None  # Extended premium
-                    })
-            
-            await db.create_user(new_user)
-            
-            # Create default settings
-            settings = UserSettings(user_id=user.id)
-            await db.create_user_settings(settings)
-            
-            logger.info(f"New user registered: {user.id}")
-        else:
-            # Update existing user info
-            await db.update_user(user.id, {
-                "username": user.username,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "language_code": user.language_code
-            })
-        
-        # Check force subscription
-        if not await check_force_subscription(user.id, context):
-            keyboard = [[InlineKeyboardButton("🔄 Check Subscription", callback_data="sub_check")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await update.message.reply_text(
-                "🚫 **Access Restricted**\n\n"
-                "To use this bot, you must join our official channels first:\n\n"
-                "Please join all required channels and then click the button below.",
-                parse_mode="Markdown",
-                reply_markup=reply_markup
-            )
-            return
-        
-        # Welcome message
-        welcome_text = f"""
+# Seconds the /about statistics are reused before being recomputed
+BOT_STATS_CACHE_TTL = 60
+
+# Last statistics shown by /about and when they were loaded
+_stats_cache = {"loaded_at": 0.0, "stats": None}
+
+_ACCESS_RESTRICTED_TEXT = (
+    "🚫 **Access Restricted**\n\n"
+    "To use this bot, you must join our official channels first:\n\n"
+    "Please join all required channels and then click the button below."
+)
+
+# Filled in with the user's first name
+_WELCOME_TEXT = """
 🎉 **Welcome to File Rename Bot!**
 
-Hi {user.first_name}! I'm here to help you rename and process your files efficiently.
+Hi {first_name}! I'm here to help you rename and process your files efficiently.
 
 🔧 **What I can do:**
 • 📁 Rename files with custom templates
@@ -103,29 +55,8 @@ Hi {user.first_name}! I'm here to help you rename and process your files efficie
 
 Ready to get started? Send me any file!
         """
-        
-        keyboard = [
-            [InlineKeyboardButton("⚙️ Settings", callback_data="settings_main")],
-            [InlineKeyboardButton("💎 Premium", callback_data="sub_premium")],
-            [InlineKeyboardButton("📚 Help", callback_data="help_main")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            welcome_text,
-            parse_mode="Markdown",
-            reply_markup=reply_markup
-        )
-        
-    except Exception as e:
-        logger.error(f"Error in start command: {e}")
-        await update.message.reply_text(
-            "❌ An error occurred while processing your request. Please try again."
-        )
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /help command"""
-    help_text = """
+_HELP_TEXT = """
 📚 **Bot Commands Help**
 
 🔧 **Basic Commands:**
@@ -168,12 +99,9 @@ Use variables in your rename templates:
 ❓ **Need Help?**
 Contact support through the bot or join our support channel.
     """
-    
-    await update.message.reply_text(help_text, parse_mode="Markdown")
 
-async def about_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /about command"""
-    about_text = """
+# Filled in with bot statistics
+_ABOUT_TEMPLATE = """
 🤖 **About File Rename Bot**
 
 **Version:** 1.0.0
@@ -197,9 +125,9 @@ async def about_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • PIL for image processing
 
 📊 **Statistics:**
-• Total Users: Getting stats...
-• Files Processed: Getting stats...
-• Premium Users: Getting stats...
+• Total Users: {total_users}
+• Files Processed: {total_files}
+• Premium Users: {premium}
 
 🤝 **Support:**
 If you encounter any issues or have suggestions, please contact our support team.
@@ -207,23 +135,133 @@ If you encounter any issues or have suggestions, please contact our support team
 💝 **Support Development:**
 This bot is free to use. Consider upgrading to premium to support development and unlock advanced features!
     """
+
+_ABOUT_TEXT_NO_STATS = _ABOUT_TEMPLATE.format(
+    total_users="Getting stats...",
+    total_files="Getting stats...",
+    premium="Getting stats..."
+)
+
+_SUBSCRIPTION_CHECK_KB = InlineKeyboardMarkup([[InlineKeyboardButton("🔄 Check Subscription", callback_data="sub_check")]])
+
+_WELCOME_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("⚙️ Settings", callback_data="settings_main")],
+    [InlineKeyboardButton("💎 Premium", callback_data="sub_premium")],
+    [InlineKeyboardButton("📚 Help", callback_data="help_main")]
+])
+
+_ABOUT_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🏠 Home", callback_data="start_main")],
+    [InlineKeyboardButton("💎 Premium", callback_data="sub_premium")]
+])
+
+async def register_user(user: TelegramUser, referral_arg: Optional[str] = None):
+    """Register or refresh a user on /start, handling referral for new users
     
+    Runs alongside the /start replies, so errors are logged here rather than raised.
+    """
     try:
-        stats = await db.get_bot_stats()
-        about_text = about_text.replace("Getting stats...", f"{stats.total_users:,}")
-        about_text = about_text.replace("Getting stats...", f"{stats.total_files_processed:,}")
-        about_text = about_text.replace("Getting stats...", f"{stats.premium_users:,}")
+        profile = {
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "language_code": user.language_code
+        }
+        new_user = User(user_id=user.id, referral_code=derive_referral_code(user.id), **profile)
+        on_insert = {
+            key: value for key, value in new_user.to_dict().items()
+            if key not in profile and key != "last_activity"
+        }
+        
+        # Register or refresh the user and make sure default settings exist
+        is_new_user, _ = await asyncio.gather(
+            db.upsert_user_on_start(user.id, profile, on_insert),
+            db.ensure_user_settings(user.id)
+        )
+        
+        if is_new_user:
+            # Handle referral if present
+            if referral_arg and referral_arg.startswith('ref_'):
+                referrer_code = referral_arg[4:]  # Remove 'ref_' prefix
+                referrer = await db.get_user_by_referral_code(referrer_code)
+                if referrer:
+                    await db.update_user(user.id, {"referred_by": referrer.user_id})
+                    # Grant referral bonus to referrer
+                    await db.update_user(referrer.user_id, {
+                        "is_premium": True,
+                        "premium_expires": None  # Extended premium
+                    })
+            
+            logger.info(f"New user registered: {user.id}")
+    
     except Exception as e:
-        logger.error(f"Error getting stats for about: {e}")
+        logger.error(f"Error registering user {user.id}: {e}")
+
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /start command"""
+    user = update.effective_user
+    chat_id = update.effective_chat.id
     
-    keyboard = [
-        [InlineKeyboardButton("🏠 Home", callback_data="start_main")],
-        [InlineKeyboardButton("💎 Premium", callback_data="sub_premium")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Registration runs alongside the subscription check and the reply
+    register_task = asyncio.create_task(
+        register_user(user, context.args[0] if context.args else None)
+    )
+    
+    try:
+        # Check force subscription
+        if not await check_force_subscription(user.id, context):
+            await update.message.reply_text(
+                _ACCESS_RESTRICTED_TEXT,
+                parse_mode="Markdown",
+                reply_markup=_SUBSCRIPTION_CHECK_KB
+            )
+            return
+        
+        # Welcome message
+        welcome_text = _WELCOME_TEXT.format(first_name=user.first_name)
+        
+        await update.message.reply_text(
+            welcome_text,
+            parse_mode="Markdown",
+            reply_markup=_WELCOME_KB
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in start command: {e}")
+        await update.message.reply_text(
+            "❌ An error occurred while processing your request. Please try again."
+        )
+    
+    finally:
+        await register_task
+
+async def get_cached_bot_stats() -> BotStats:
+    """Get bot statistics, reusing the last result for BOT_STATS_CACHE_TTL seconds"""
+    now = time.time()
+    if _stats_cache["stats"] is None or now - _stats_cache["loaded_at"] >= BOT_STATS_CACHE_TTL:
+        _stats_cache["stats"] = await db.get_bot_stats()
+        _stats_cache["loaded_at"] = now
+    return _stats_cache["stats"]
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /help command"""
+    await update.message.reply_text(_HELP_TEXT, parse_mode="Markdown")
+
+async def about_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /about command"""
+    try:
+        stats = await get_cached_bot_stats()
+        about_text = _ABOUT_TEMPLATE.format(
+            total_users=f"{stats.total_users:,}",
+            total_files=f"{stats.total_files_processed:,}",
+            premium=f"{stats.premium_users:,}"
+        )
+    except Exception as e:
+        logger.error(f"Error getting stats for about: {e}")
+        about_text = _ABOUT_TEXT_NO_STATS
     
     await update.message.reply_text(
         about_text,
         parse_mode="Markdown",
-        reply_markup=reply_markup
+        reply_markup=_ABOUT_KB
     )
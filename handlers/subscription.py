@@ -2,18 +2,275 @@
 Subscription and premium features handler
 """
 
+import asyncio
+import functools
+import html
 import logging
-from datetime import datetime, timedelta
+import time
+from datetime import timedelta
+from types import MappingProxyType
+from typing import Dict, List, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
 from database.connection import db
-from database.models import User
+from database.models import User, ForceSubChannel
 from utils.helpers import generate_referral_code
-from middleware.subscription_check import check_force_subscription
+from middleware.subscription_check import check_force_subscription, subscription_manager
 
 logger = logging.getLogger(__name__)
 
+# Seconds a confirmed channel membership is trusted before asking Telegram again
+MEMBERSHIP_CACHE_TTL = 90
+MEMBERSHIP_CACHE_MAX_SIZE = 100000
+
+# (user_id, channel_id) -> confirmed_at; only memberships are cached so a user
+# who just joined is never shown a stale "not subscribed"
+_membership_cache: Dict[Tuple[int, str], float] = {}
+
+# Seconds within which a repeated tap on the same button is ignored
+CALLBACK_DEBOUNCE_SECONDS = 0.5
+CALLBACK_DEBOUNCE_MAX_SIZE = 50000
+
+# (user_id, callback_data) -> last handled at
+_recent_callbacks: Dict[Tuple[int, str], float] = {}
+
+# Purchase callback action -> (package name, price, days)
+_DURATION_MAP = MappingProxyType({
+    "buy_1m": ("1 Month", "$4.99", 30),
+    "buy_3m": ("3 Months", "$12.99", 90),
+    "buy_6m": ("6 Months", "$22.99", 180),
+    "buy_1y": ("1 Year", "$39.99", 365)
+})
+
+# Messages are built as HTML so user values only need html.escape
+_PARSE_MODE = ParseMode.HTML
+
+_PREMIUM_STATUS = {True: "✅ Active", False: "❌ Inactive"}
+
+# Filled in with the premium expiry
+_PREMIUM_ACTIVE_TEXT = """
+💎 <b>Premium Status: ACTIVE</b>
+
+✅ <b>Your Premium Benefits:</b>
+• 📁 Unlimited file processing
+• 🚀 Priority processing queue
+• 🎨 Custom thumbnails
+• ⚡ Advanced auto-rename features
+• 📊 Detailed processing statistics
+• 🔧 Advanced settings options
+• 🎯 Batch file processing
+• 💾 Extended file storage
+
+⏰ <b>Premium Valid Until:</b> {valid_until}
+
+🎁 <b>Invite Friends:</b>
+Share your referral link and get premium extensions!
+            """
+
+_PREMIUM_INACTIVE_TEXT = """
+💎 <b>Upgrade to Premium</b>
+
+🚀 <b>Premium Features:</b>
+• 📁 <b>Unlimited Processing</b> - No daily limits
+• 🎨 <b>Custom Thumbnails</b> - Add your own thumbnails
+• ⚡ <b>Priority Queue</b> - Faster processing
+• 🔧 <b>Advanced Settings</b> - More customization options
+• 📊 <b>Detailed Statistics</b> - Track your usage
+• 🎯 <b>Batch Processing</b> - Process multiple files
+• 💾 <b>Extended Storage</b> - Keep files longer
+• 🔄 <b>Auto-Rename Plus</b> - Advanced templates
+
+💰 <b>Pricing:</b>
+• 1 Month: $4.99
+• 3 Months: $12.99 (Save 13%)
+• 6 Months: $22.99 (Save 23%)
+• 1 Year: $39.99 (Save 33%)
+
+🎁 <b>Get Premium Free:</b>
+Refer friends and get premium extensions!
+            """
+
+# Filled in with the user's referral details
+_REFERRAL_TEXT = """
+🎁 <b>Referral Program</b>
+
+<b>Your Referral Code:</b> <code>{referral_code}</code>
+<b>Your Referral Link:</b> {referral_link}
+
+📊 <b>Your Referral Stats:</b>
+• Total Referrals: {referral_count}
+• Premium Days Earned: {premium_earned}
+• Current Premium Status: {premium_status}
+
+🎯 <b>How it Works:</b>
+1. Share your referral link with friends
+2. When they start the bot, you both get benefits
+3. You get 30 days of premium for each referral
+4. Your friends get 7 days of premium bonus
+
+💡 <b>Tips to Get More Referrals:</b>
+• Share in groups and channels
+• Tell friends about the bot's features
+• Post on social media
+• Help others with file processing
+
+🎁 <b>Referral Rewards:</b>
+• 1 Referral = 30 days premium
+• 5 Referrals = 6 months premium
+• 10 Referrals = 1 year premium
+• 25 Referrals = Lifetime premium
+        """
+
+# Filled in with the chosen package
+_PURCHASE_TEXT = """
+💳 <b>Premium Purchase</b>
+
+<b>Package:</b> {duration}
+<b>Price:</b> {price}
+<b>Duration:</b> {days} days
+
+⚠️ <b>Payment Instructions:</b>
+This is a demo implementation. In a real bot, you would:
+1. Integrate with payment providers (Stripe, PayPal, etc.)
+2. Handle payment verification
+3. Activate premium automatically
+
+For now, contact an admin to upgrade your account.
+        """
+
+# Filled in with the user's referral link; plain text, as users copy it verbatim
+# from the <pre> block in _SHARE_REPLY_TEXT
+_SHARE_TEXT = """
+🤖 Check out this amazing File Rename Bot!
+
+I've been using this bot to rename and process my files - it's incredible!
+
+✨ Features:
+• Rename files with custom templates
+• Add custom thumbnails
+• Process files up to 5GB
+• Auto-rename functionality
+• Premium features available
+
+🎁 Join using my referral link and get premium bonus:
+{referral_link}
+
+Try it now! 🚀
+        """
+
+_SHARE_REPLY_TEXT = (
+    "📤 <b>Share This Message</b>\n\n"
+    "Copy and share this message with your friends:\n\n"
+    "<pre>" + html.escape(_SHARE_TEXT, quote=False) + "</pre>"
+)
+
+# Filled in with the user's processing statistics
+_PREMIUM_STATS_TEXT = """
+📊 <b>Your Premium Statistics</b>
+
+🎯 <b>Processing Stats:</b>
+• Total Files Processed: {total_files:,}
+• Successfully Completed: {completed_files:,}
+• Failed Processing: {failed_files:,}
+• Success Rate: {success_rate:.1f}%
+
+💾 <b>Data Usage:</b>
+• Total Data Processed: {total_size}
+• Average File Size: {average_size}
+
+💎 <b>Premium Status:</b>
+• Status: {premium_status}
+• Valid Until: {valid_until}
+• Referrals Made: Calculating...
+
+📈 <b>Recent Activity:</b>
+• Files This Week: {week}
+• Files This Month: {month}
+        """
+
+# Filled in with the user's premium status and referral code
+_REFERRAL_STATS_TEXT = """
+📊 <b>Detailed Referral Statistics</b>
+
+🎯 <b>Referral Performance:</b>
+• Total Referrals: 0
+• Active Referrals: 0
+• Premium Referrals: 0
+• Referral Conversion Rate: 0%
+
+💰 <b>Earnings:</b>
+• Premium Days Earned: 0
+• Current Premium Status: {premium_status}
+• Next Milestone: 1 referral for 30 days premium
+
+📈 <b>Progress:</b>
+• Progress to Next Reward: 0/1 referrals
+• Progress to Lifetime Premium: 0/25 referrals
+
+🎁 <b>Referral Rewards:</b>
+• 1 Referral = 30 days premium
+• 5 Referrals = 6 months premium
+• 10 Referrals = 1 year premium
+• 25 Referrals = Lifetime premium
+
+<b>Your Referral Code:</b> <code>{referral_code}</code>
+        """
+
+# Static keyboards
+_SUBSCRIPTION_CHECK_KB = InlineKeyboardMarkup([[InlineKeyboardButton("🔄 Check Subscription", callback_data="sub_check")]])
+
+_PREMIUM_ACTIVE_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔗 Get Referral Link", callback_data="sub_referral")],
+    [InlineKeyboardButton("📊 Premium Stats", callback_data="sub_stats")],
+    [InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")]
+])
+
+_PREMIUM_INACTIVE_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("💳 1 Month - $4.99", callback_data="sub_buy_1m")],
+    [InlineKeyboardButton("💳 3 Months - $12.99", callback_data="sub_buy_3m")],
+    [InlineKeyboardButton("💳 6 Months - $22.99", callback_data="sub_buy_6m")],
+    [InlineKeyboardButton("💳 1 Year - $39.99", callback_data="sub_buy_1y")],
+    [InlineKeyboardButton("🎁 Get Free Premium", callback_data="sub_referral")],
+    [InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")]
+])
+
+_REFERRAL_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📋 Copy Link", callback_data="sub_copy_link")],
+    [InlineKeyboardButton("📤 Share Link", callback_data="sub_share_link")],
+    [InlineKeyboardButton("📊 Referral Stats", callback_data="sub_referral_stats")],
+    [InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")]
+])
+
+_PURCHASE_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("💬 Contact Admin", url="https://t.me/YourAdminUsername")],
+    [InlineKeyboardButton("⬅️ Back to Premium", callback_data="sub_premium")]
+])
+
+_PREMIUM_STATS_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📁 Recent Files", callback_data="sub_recent_files")],
+    [InlineKeyboardButton("⬅️ Back to Premium", callback_data="sub_premium")]
+])
+
+_REFERRAL_STATS_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔗 Get Referral Link", callback_data="sub_copy_link")],
+    [InlineKeyboardButton("⬅️ Back to Referral", callback_data="sub_referral")]
+])
+
+_BACK_TO_REFERRAL_KB = InlineKeyboardMarkup([[
+    InlineKeyboardButton("⬅️ Back to Referral", callback_data="sub_referral")
+]])
+
+_MAIN_MENU_KB = InlineKeyboardMarkup([[
+    InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")
+]])
+
+@functools.lru_cache(maxsize=1024)
+def build_referral_link(bot_username: str, referral_code: str) -> str:
+    """Build a user's referral deep link"""
+    return f"https://t.me/{bot_username}?start=ref_{referral_code}"
+
 async def premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /premium command"""
     user_id = update.effective_user.id
@@ -21,14 +278,11 @@ async def premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Check force subscription first
         if not await check_force_subscription(user_id, context):
-            keyboard = [[InlineKeyboardButton("🔄 Check Subscription", callback_data="sub_check")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             await update.message.reply_text(
-                "🚫 **Access Restricted**\n\n"
+                "🚫 <b>Access Restricted</b>\n\n"
                 "Please join our required channels to access premium features.",
-                parse_mode="Markdown",
-                reply_markup=reply_markup
+                parse_mode=_PARSE_MODE,
+                reply_markup=_SUBSCRIPTION_CHECK_KB
             )
             return
         
@@ -40,7 +294,7 @@ async def premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_premium_menu(update, context, user)
         
     except Exception as e:
-        logger.error(f"Error in premium command: {e}")
+        logger.error("Error in premium command: %s", e)
         await update.message.reply_text(
             "❌ An error occurred while loading premium features."
         )
@@ -51,80 +305,29 @@ async def show_premium_menu(update: Update, context: ContextTypes.DEFAULT_TYPE,
         is_premium = user.is_premium_active()
         
         if is_premium:
-            premium_text = f"""
-💎 **Premium Status: ACTIVE**
-
-✅ **Your Premium Benefits:**
-• 📁 Unlimited file processing
-• 🚀 Priority processing queue
-• 🎨 Custom thumbnails
-• ⚡ Advanced auto-rename features
-• 📊 Detailed processing statistics
-• 🔧 Advanced settings options
-• 🎯 Batch file processing
-• 💾 Extended file storage
-
-⏰ **Premium Valid Until:** {user.premium_expires.strftime('%Y-%m-%d %H:%M:%S') if user.premium_expires else 'Lifetime'}
-
-🎁 **Invite Friends:**
-Share your referral link and get premium extensions!
-            """
-            
-            keyboard = [
-                [InlineKeyboardButton("🔗 Get Referral Link", callback_data="sub_referral")],
-                [InlineKeyboardButton("📊 Premium Stats", callback_data="sub_stats")],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")]
-            ]
+            premium_text = _PREMIUM_ACTIVE_TEXT.format(
+                valid_until=user.premium_expires.strftime('%Y-%m-%d %H:%M:%S') if user.premium_expires else 'Lifetime'
+            )
+            reply_markup = _PREMIUM_ACTIVE_KB
         else:
-            premium_text = f"""
-💎 **Upgrade to Premium**
-
-🚀 **Premium Features:**
-• 📁 **Unlimited Processing** - No daily limits
-• 🎨 **Custom Thumbnails** - Add your own thumbnails
-• ⚡ **Priority Queue** - Faster processing
-• 🔧 **Advanced Settings** - More customization options
-• 📊 **Detailed Statistics** - Track your usage
-• 🎯 **Batch Processing** - Process multiple files
-• 💾 **Extended Storage** - Keep files longer
-• 🔄 **Auto-Rename Plus** - Advanced templates
-
-💰 **Pricing:**
-• 1 Month: $4.99
-• 3 Months: $12.99 (Save 13%)
-• 6 Months: $22.99 (Save 23%)
-• 1 Year: $39.99 (Save 33%)
-
-🎁 **Get Premium Free:**
-Refer friends and get premium extensions!
-            """
-            
-            keyboard = [
-                [InlineKeyboardButton("💳 1 Month - $4.99", callback_data="sub_buy_1m")],
-                [InlineKeyboardButton("💳 3 Months - $12.99", callback_data="sub_buy_3m")],
-                [InlineKeyboardButton("💳 6 Months - $22.99", callback_data="sub_buy_6m")],
-                [InlineKeyboardButton("💳 1 Year - $39.99", callback_data="sub_buy_1y")],
-                [InlineKeyboardButton("🎁 Get Free Premium", callback_data="sub_referral")],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")]
-            ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+            premium_text = _PREMIUM_INACTIVE_TEXT
+            reply_markup = _PREMIUM_INACTIVE_KB
         
         if update.callback_query:
             await update.callback_query.edit_message_text(
                 premium_text,
-                parse_mode="Markdown",
+                parse_mode=_PARSE_MODE,
                 reply_markup=reply_markup
             )
         else:
             await update.message.reply_text(
                 premium_text,
-                parse_mode="Markdown",
+                parse_mode=_PARSE_MODE,
                 reply_markup=reply_markup
             )
             
     except Exception as e:
-        logger.error(f"Error showing premium menu: {e}")
+        logger.error("Error showing premium menu: %s", e)
         await update.message.reply_text(
             "❌ An error occurred while loading premium information."
         )
@@ -142,7 +345,7 @@ async def referral_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_referral_info(update, context, user)
         
     except Exception as e:
-        logger.error(f"Error in referral command: {e}")
+        logger.error("Error in referral command: %s", e)
         await update.message.reply_text(
             "❌ An error occurred while loading referral information."
         )
@@ -155,62 +358,33 @@ async def show_referral_info(update: Update, context: ContextTypes.DEFAULT_TYPE,
         referral_count = 0  # Number of users referred
         premium_earned = 0  # Premium days earned
         
-        bot_username = context.bot.username
-        referral_link = f"https://t.me/{bot_username}?start=ref_{user.referral_code}"
+        referral_link = build_referral_link(context.bot.username, user.referral_code)
         
-        referral_text = f"""
-🎁 **Referral Program**
-
-**Your Referral Code:** `{user.referral_code}`
-**Your Referral Link:** {referral_link}
-
-📊 **Your Referral Stats:**
-• Total Referrals: {referral_count}
-• Premium Days Earned: {premium_earned}
-• Current Premium Status: {'✅ Active' if user.is_premium_active() else '❌ Inactive'}
-
-🎯 **How it Works:**
-1. Share your referral link with friends
-2. When they start the bot, you both get benefits
-3. You get 30 days of premium for each referral
-4. Your friends get 7 days of premium bonus
-
-💡 **Tips to Get More Referrals:**
-• Share in groups and channels
-• Tell friends about the bot's features
-• Post on social media
-• Help others with file processing
-
-🎁 **Referral Rewards:**
-• 1 Referral = 30 days premium
-• 5 Referrals = 6 months premium
-• 10 Referrals = 1 year premium
-• 25 Referrals = Lifetime premium
-        """
+        referral_text = _REFERRAL_TEXT.format(
+            referral_code=html.escape(user.referral_code),
+            referral_link=html.escape(referral_link),
+            referral_count=referral_count,
+            premium_earned=premium_earned,
+            premium_status=_PREMIUM_STATUS[user.is_premium_active()]
+        )
         
-        keyboard = [
-            [InlineKeyboardButton("📋 Copy Link", callback_data="sub_copy_link")],
-            [InlineKeyboardButton("📤 Share Link", callback_data="sub_share_link")],
-            [InlineKeyboardButton("📊 Referral Stats", callback_data="sub_referral_stats")],
-            [InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = _REFERRAL_KB
         
         if update.callback_query:
             await update.callback_query.edit_message_text(
                 referral_text,
-                parse_mode="Markdown",
+                parse_mode=_PARSE_MODE,
                 reply_markup=reply_markup
             )
         else:
             await update.message.reply_text(
                 referral_text,
-                parse_mode="Markdown",
+                parse_mode=_PARSE_MODE,
                 reply_markup=reply_markup
             )
             
     except Exception as e:
-        logger.error(f"Error showing referral info: {e}")
+        logger.error("Error showing referral info: %s", e)
         await update.message.reply_text(
             "❌ An error occurred while loading referral information."
         )
@@ -221,7 +395,18 @@ async def subscription_callback(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
     
     user_id = update.effective_user.id
-    action = query.data.replace("sub_", "")
+    
+    # Drop repeated taps on the same button; the first tap is already re-rendering
+    key = (user_id, query.data)
+    now = time.monotonic()
+    if now - _recent_callbacks.get(key, float("-inf")) < CALLBACK_DEBOUNCE_SECONDS:
+        return
+    _recent_callbacks.pop(key, None)
+    if len(_recent_callbacks) >= CALLBACK_DEBOUNCE_MAX_SIZE:
+        _recent_callbacks.pop(next(iter(_recent_callbacks)))
+    _recent_callbacks[key] = now
+    
+    action = query.data.partition("_")[2]
     
     try:
         user = await db.get_user(user_id)
@@ -229,97 +414,96 @@ async def subscription_callback(update: Update, context: ContextTypes.DEFAULT_TY
             await query.edit_message_text("❌ User not found. Please start the bot first.")
             return
         
-        if action == "premium":
-            await show_premium_menu(update, context, user)
-        
-        elif action == "referral":
-            await show_referral_info(update, context, user)
-        
-        elif action == "check":
-            await check_subscription_status(update, context, user_id)
-        
+        handler = _CALLBACK_ACTIONS.get(action)
+        if handler:
+            await handler(update, context, user)
         elif action.startswith("buy_"):
             await handle_premium_purchase(update, context, action, user)
-        
-        elif action == "copy_link":
-            await handle_copy_referral_link(update, context, user)
-        
-        elif action == "share_link":
-            await handle_share_referral_link(update, context, user)
-        
-        elif action == "stats":
-            await show_premium_stats(update, context, user)
-        
-        elif action == "referral_stats":
-            await show_referral_stats(update, context, user)
             
     except Exception as e:
-        logger.error(f"Error in subscription callback: {e}")
+        logger.error("Error in subscription callback: %s", e)
         await query.edit_message_text(
             "❌ An error occurred while processing your request."
         )
 
+async def get_unjoined_channels(context: ContextTypes.DEFAULT_TYPE, user_id: int, channels: List[ForceSubChannel]) -> List[ForceSubChannel]:
+    """Return the channels the user has not joined, checking uncached channels concurrently"""
+    now = time.time()
+    to_check = [
+        channel for channel in channels
+        if now - _membership_cache.get((user_id, channel.channel_id), 0.0) >= MEMBERSHIP_CACHE_TTL
+    ]
+    if not to_check:
+        return []
+    
+    members = await asyncio.gather(
+        *(context.bot.get_chat_member(channel.channel_id, user_id) for channel in to_check),
+        return_exceptions=True
+    )
+    
+    not_subscribed = []
+    for channel, member in zip(to_check, members):
+        # If we can't check, assume not subscribed
+        if isinstance(member, Exception) or member.status in ['left', 'kicked']:
+            not_subscribed.append(channel)
+            continue
+        
+        key = (user_id, channel.channel_id)
+        _membership_cache.pop(key, None)
+        if len(_membership_cache) >= MEMBERSHIP_CACHE_MAX_SIZE:
+            _membership_cache.pop(next(iter(_membership_cache)))
+        _membership_cache[key] = now
+    
+    return not_subscribed
+
+async def _check_subscription_for(update: Update, context: ContextTypes.DEFAULT_TYPE, user: User):
+    """Adapt check_subscription_status to the callback handler signature"""
+    await check_subscription_status(update, context, user.user_id)
+
 async def check_subscription_status(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Check user's subscription status to required channels"""
     try:
+        # The user may have just joined, so drop any cached result
+        subscription_manager.clear_cache(user_id)
+        
         channels = await db.get_force_sub_channels()
         
         if not channels:
             await update.callback_query.edit_message_text(
-                "✅ **No Subscription Required**\n\n"
+                "✅ <b>No Subscription Required</b>\n\n"
                 "You can use the bot without any restrictions!",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")
-                ]])
+                parse_mode=_PARSE_MODE,
+                reply_markup=_MAIN_MENU_KB
             )
             return
         
-        not_subscribed = []
-        
-        for channel in channels:
-            try:
-                member = await context.bot.get_chat_member(channel.channel_id, user_id)
-                if member.status in ['left', 'kicked']:
-                    not_subscribed.append(channel)
-            except Exception:
-                # If we can't check, assume not subscribed
-                not_subscribed.append(channel)
+        not_subscribed = await get_unjoined_channels(context, user_id, channels)
         
         if not_subscribed:
-            channels_text = "🚫 **Subscription Required**\n\n"
+            channels_text = "🚫 <b>Subscription Required</b>\n\n"
             channels_text += "Please join these channels to use the bot:\n\n"
             
             keyboard = []
             for channel in not_subscribed:
-                if channel.channel_username:
-                    keyboard.append([InlineKeyboardButton(
-                        f"📺 Join {channel.channel_name}",
-                        url=f"https://t.me/{channel.channel_username.replace('@', '')}"
-                    )])
-                else:
-                    keyboard.append([InlineKeyboardButton(
-                        f"📺 Join {channel.channel_name}",
-                        url=f"https://t.me/c/{channel.channel_id.replace('-100', '')}"
-                    )])
+                keyboard.append([InlineKeyboardButton(f"📺 Join {channel.channel_name}", url=channel.join_url)])
             
             keyboard.append([InlineKeyboardButton("🔄 Check Again", callback_data="sub_check")])
             
             await update.callback_query.edit_message_text(
                 channels_text,
-                parse_mode="Markdown",
+                parse_mode=_PARSE_MODE,
                 reply_markup=InlineKeyboardMarkup(keyboard)
             )
         else:
             await update.callback_query.edit_message_text(
-                "✅ **Subscription Verified**\n\n"
+                "✅ <b>Subscription Verified</b>\n\n"
                 "Welcome! You can now use all bot features.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")
-                ]])
+                parse_mode=_PARSE_MODE,
+                reply_markup=_MAIN_MENU_KB
             )
             
     except Exception as e:
-        logger.error(f"Error checking subscription status: {e}")
+        logger.error("Error checking subscription status: %s", e)
         await update.callback_query.edit_message_text(
             "❌ An error occurred while checking your subscription status."
         )
@@ -327,49 +511,23 @@ async def check_subscription_status(update: Update, context: ContextTypes.DEFAUL
 async def handle_premium_purchase(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str, user: User):
     """Handle premium purchase requests"""
     try:
-        duration_map = {
-            "buy_1m": ("1 Month", "$4.99", 30),
-            "buy_3m": ("3 Months", "$12.99", 90),
-            "buy_6m": ("6 Months", "$22.99", 180),
-            "buy_1y": ("1 Year", "$39.99", 365)
-        }
-        
-        if action not in duration_map:
+        package = _DURATION_MAP.get(action)
+        if package is None:
             await update.callback_query.edit_message_text("❌ Invalid purchase option.")
             return
         
-        duration, price, days = duration_map[action]
+        duration, price, days = package
         
-        purchase_text = f"""
-💳 **Premium Purchase**
-
-**Package:** {duration}
-**Price:** {price}
-**Duration:** {days} days
-
-⚠️ **Payment Instructions:**
-This is a demo implementation. In a real bot, you would:
-1. Integrate with payment providers (Stripe, PayPal, etc.)
-2. Handle payment verification
-3. Activate premium automatically
-
-For now, contact an admin to upgrade your account.
-        """
-        
-        keyboard = [
-            [InlineKeyboardButton("💬 Contact Admin", url="https://t.me/YourAdminUsername")],
-            [InlineKeyboardButton("⬅️ Back to Premium", callback_data="sub_premium")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        purchase_text = _PURCHASE_TEXT.format(duration=duration, price=price, days=days)
         
         await update.callback_query.edit_message_text(
             purchase_text,
-            parse_mode="Markdown",
-            reply_markup=reply_markup
+            parse_mode=_PARSE_MODE,
+            reply_markup=_PURCHASE_KB
         )
         
     except Exception as e:
-        logger.error(f"Error handling premium purchase: {e}")
+        logger.error("Error handling premium purchase: %s", e)
         await update.callback_query.edit_message_text(
             "❌ An error occurred while processing your purchase request."
         )
@@ -377,21 +535,18 @@ For now, contact an admin to upgrade your account.
 async def handle_copy_referral_link(update: Update, context: ContextTypes.DEFAULT_TYPE, user: User):
     """Handle copy referral link request"""
     try:
-        bot_username = context.bot.username
-        referral_link = f"https://t.me/{bot_username}?start=ref_{user.referral_code}"
+        referral_link = build_referral_link(context.bot.username, user.referral_code)
         
         await update.callback_query.edit_message_text(
-            f"📋 **Referral Link Copied**\n\n"
-            f"`{referral_link}`\n\n"
+            f"📋 <b>Referral Link Copied</b>\n\n"
+            f"<code>{html.escape(referral_link)}</code>\n\n"
             f"Share this link with your friends to earn premium time!",
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ Back to Referral", callback_data="sub_referral")
-            ]])
+            parse_mode=_PARSE_MODE,
+            reply_markup=_BACK_TO_REFERRAL_KB
         )
         
     except Exception as e:
-        logger.error(f"Error copying referral link: {e}")
+        logger.error("Error copying referral link: %s", e)
         await update.callback_query.edit_message_text(
             "❌ An error occurred while copying your referral link."
         )
@@ -399,39 +554,16 @@ async def handle_copy_referral_link(update: Update, context: ContextTypes.DEFAUL
 async def handle_share_referral_link(update: Update, context: ContextTypes.DEFAULT_TYPE, user: User):
     """Handle share referral link request"""
     try:
-        bot_username = context.bot.username
-        referral_link = f"https://t.me/{bot_username}?start=ref_{user.referral_code}"
-        
-        share_text = f"""
-🤖 **Check out this amazing File Rename Bot!**
-
-I've been using this bot to rename and process my files - it's incredible!
-
-✨ **Features:**
-• Rename files with custom templates
-• Add custom thumbnails
-• Process files up to 5GB
-• Auto-rename functionality
-• Premium features available
-
-🎁 **Join using my referral link and get premium bonus:**
-{referral_link}
-
-Try it now! 🚀
-        """
+        referral_link = build_referral_link(context.bot.username, user.referral_code)
         
         await update.callback_query.edit_message_text(
-            f"📤 **Share This Message**\n\n"
-            f"Copy and share this message with your friends:\n\n"
-            f"```\n{share_text}\n```",
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("⬅️ Back to Referral", callback_data="sub_referral")
-            ]])
+            _SHARE_REPLY_TEXT.format(referral_link=html.escape(referral_link)),
+            parse_mode=_PARSE_MODE,
+            reply_markup=_BACK_TO_REFERRAL_KB
         )
         
     except Exception as e:
-        logger.error(f"Error sharing referral link: {e}")
+        logger.error("Error sharing referral link: %s", e)
         await update.callback_query.edit_message_text(
             "❌ An error occurred while preparing your referral message."
         )
@@ -440,52 +572,37 @@ async def show_premium_stats(update: Update, context: ContextTypes.DEFAULT_TYPE,
     """Show premium user statistics"""
     try:
         # Get user's file processing stats
-        file_records = await db.get_user_file_records(user.user_id, limit=1000)
-        
-        total_files = len(file_records)
-        completed_files = len([r for r in file_records if r.processing_status == "completed"])
-        failed_files = len([r for r in file_records if r.processing_status == "failed"])
-        
-        # Calculate total file size processed
-        total_size = sum(r.file_size for r in file_records)
-        
-        stats_text = f"""
-📊 **Your Premium Statistics**
-
-🎯 **Processing Stats:**
-• Total Files Processed: {total_files:,}
-• Successfully Completed: {completed_files:,}
-• Failed Processing: {failed_files:,}
-• Success Rate: {(completed_files/total_files*100):.1f}% if total_files > 0 else 0%
-
-💾 **Data Usage:**
-• Total Data Processed: {format_file_size(total_size)}
-• Average File Size: {format_file_size(total_size/total_files) if total_files > 0 else '0 B'}
-
-💎 **Premium Status:**
-• Status: {'✅ Active' if user.is_premium_active() else '❌ Inactive'}
-• Valid Until: {user.premium_expires.strftime('%Y-%m-%d') if user.premium_expires else 'Lifetime'}
-• Referrals Made: Calculating...
-
-📈 **Recent Activity:**
-• Files This Week: {len([r for r in file_records if (datetime.now() - r.created_at).days <= 7])}
-• Files This Month: {len([r for r in file_records if (datetime.now() - r.created_at).days <= 30])}
-        """
-        
-        keyboard = [
-            [InlineKeyboardButton("📁 Recent Files", callback_data="sub_recent_files")],
-            [InlineKeyboardButton("⬅️ Back to Premium", callback_data="sub_premium")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        file_stats = await db.get_user_file_stats(user.user_id)
+        
+        total_files = file_stats["total"]
+        completed_files = file_stats["completed"]
+        failed_files = file_stats["failed"]
+        total_size = file_stats["total_size"]
+        
+        success_rate = completed_files / total_files * 100 if total_files else 0.0
+        average_size = format_file_size(total_size / total_files) if total_files else "0 B"
+        
+        stats_text = _PREMIUM_STATS_TEXT.format(
+            total_files=total_files,
+            completed_files=completed_files,
+            failed_files=failed_files,
+            success_rate=success_rate,
+            total_size=format_file_size(total_size),
+            average_size=average_size,
+            premium_status=_PREMIUM_STATUS[user.is_premium_active()],
+            valid_until=user.premium_expires.strftime('%Y-%m-%d') if user.premium_expires else 'Lifetime',
+            week=file_stats["week"],
+            month=file_stats["month"]
+        )
         
         await update.callback_query.edit_message_text(
             stats_text,
-            parse_mode="Markdown",
-            reply_markup=reply_markup
+            parse_mode=_PARSE_MODE,
+            reply_markup=_PREMIUM_STATS_KB
         )
         
     except Exception as e:
-        logger.error(f"Error showing premium stats: {e}")
+        logger.error("Error showing premium stats: %s", e)
         await update.callback_query.edit_message_text(
             "❌ An error occurred while loading your statistics."
         )
@@ -494,60 +611,41 @@ async def show_referral_stats(update: Update, context: ContextTypes.DEFAULT_TYPE
     """Show detailed referral statistics"""
     try:
         # This would require additional database queries in a real implementation
-        referral_stats_text = f"""
-📊 **Detailed Referral Statistics**
-
-🎯 **Referral Performance:**
-• Total Referrals: 0
-• Active Referrals: 0
-• Premium Referrals: 0
-• Referral Conversion Rate: 0%
-
-💰 **Earnings:**
-• Premium Days Earned: 0
-• Current Premium Status: {'✅ Active' if user.is_premium_active() else '❌ Inactive'}
-• Next Milestone: 1 referral for 30 days premium
-
-📈 **Progress:**
-• Progress to Next Reward: 0/1 referrals
-• Progress to Lifetime Premium: 0/25 referrals
-
-🎁 **Referral Rewards:**
-• 1 Referral = 30 days premium
-• 5 Referrals = 6 months premium
-• 10 Referrals = 1 year premium
-• 25 Referrals = Lifetime premium
-
-**Your Referral Code:** `{user.referral_code}`
-        """
-        
-        keyboard = [
-            [InlineKeyboardButton("🔗 Get Referral Link", callback_data="sub_copy_link")],
-            [InlineKeyboardButton("⬅️ Back to Referral", callback_data="sub_referral")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        referral_stats_text = _REFERRAL_STATS_TEXT.format(
+            premium_status=_PREMIUM_STATUS[user.is_premium_active()],
+            referral_code=html.escape(user.referral_code)
+        )
         
         await update.callback_query.edit_message_text(
             referral_stats_text,
-            parse_mode="Markdown",
-            reply_markup=reply_markup
+            parse_mode=_PARSE_MODE,
+            reply_markup=_REFERRAL_STATS_KB
         )
         
     except Exception as e:
-        logger.error(f"Error showing referral stats: {e}")
+        logger.error("Error showing referral stats: %s", e)
         await update.callback_query.edit_message_text(
             "❌ An error occurred while loading your referral statistics."
         )
 
+# subscription_callback routing: callback data minus "sub_" -> handler(update, context, user)
+_CALLBACK_ACTIONS = {
+    "premium": show_premium_menu,
+    "referral": show_referral_info,
+    "check": _check_subscription_for,
+    "copy_link": handle_copy_referral_link,
+    "share_link": handle_share_referral_link,
+    "stats": show_premium_stats,
+    "referral_stats": show_referral_stats,
+}
+
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+
 def format_file_size(size_bytes):
     """Format file size in human readable format"""
     if size_bytes == 0:
         return "0 B"
     
-    size_names = ["B", "KB", "MB", "GB", "TB"]
-    i = 0
-    while size_bytes >= 1024 and i < len(size_names) - 1:
-        size_bytes /= 1024
-        i += 1
-    
-    return f"{size_bytes:.1f} {size_names[i]}"
+    # Units are powers of 2**10, so the bit length picks the unit directly
+    i = min(max((int(size_bytes).bit_length() - 1) // 10, 0), len(_SIZE_UNITS) - 1)
+    return f"{size_bytes / (1 << (10 * i)):.1f} {_SIZE_UNITS[i]}"
@@ -3,13 +3,22 @@ Thumbnail management handler
 """
 
 import os
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from io import BytesIO
+from typing import Iterable
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from PIL import Image
+from PIL import Image, __version__ as PIL_VERSION
 import uuid
 
+try:
+    import jpegtran
+except ImportError:
+    jpegtran = None
+
 from config import Config
 from database.connection import db
 from database.models import Thumbnail
@@ -18,6 +27,117 @@ from middleware.subscription_check import check_force_subscription
 
 logger = logging.getLogger(__name__)
 
+# Pillow-SIMD is a drop-in replacement that ships as the same PIL package with a
+# ".postN" version suffix; log which build is doing the resizing so a deploy that
+# silently falls back to stock Pillow shows up in the logs.
+PIL_VARIANT = "Pillow-SIMD" if ".post" in PIL_VERSION else "Pillow"
+logger.info("Thumbnail processing using %s %s", PIL_VARIANT, PIL_VERSION)
+
+_THUMBNAIL_SIZE = (320, 180)
+# Uploads above this many pixels are refused before decoding (decompression bombs)
+_MAX_THUMBNAIL_PIXELS = 50_000_000
+_JPEG_MAGIC = b"\xff\xd8\xff"
+_PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+# Progressive 4:2:0 at this quality is visually lossless at thumbnail size
+_JPEG_QUALITY = 80
+
+# Thumbnail directory with its trailing separator stripped, resolved once
+_THUMBNAIL_DIR = Config.THUMBNAIL_PATH.rstrip(os.sep)
+
+def _thumbnail_path(thumbnail_id: str) -> str:
+    """Path of a stored thumbnail file"""
+    return f"{_THUMBNAIL_DIR}{os.sep}{thumbnail_id}.jpg"
+
+# Pillow releases the GIL in its C code, so resizes overlap across threads
+# while the event loop keeps serving updates
+_THUMB_POOL = ThreadPoolExecutor(
+    max_workers=min(4, os.cpu_count() or 2),
+    thread_name_prefix="thumbnail",
+)
+
+# Static menu texts and keyboards, built once at import time
+_ACCESS_RESTRICTED_TEXT = (
+    "🚫 **Access Restricted**\n\n"
+    "Please join our required channels to use thumbnail features."
+)
+
+_THUMBNAIL_MENU_TEXT = """
+🖼️ **Thumbnail Management**
+
+Upload custom thumbnails to use with your video files!
+
+📊 **Your Thumbnails:** {count}
+📝 **Status:** {status}
+
+🎯 **How to Use:**
+1. Send a photo to upload as thumbnail
+2. Give it a name for easy identification
+3. Select it when processing video files
+4. Delete unused thumbnails to save space
+
+💡 **Tips:**
+• Use high-quality images (1280x720 recommended)
+• JPG/PNG formats supported
+• Keep thumbnails relevant to your content
+• Premium users get unlimited thumbnails
+        """
+
+_EMPTY_THUMBNAILS_TEXT = """
+🖼️ **Your Thumbnails**
+
+You don't have any thumbnails yet.
+
+📤 **Upload Your First Thumbnail:**
+1. Click "Upload Thumbnail" below
+2. Send a photo
+3. Give it a name
+4. Start using it with your videos!
+
+💡 **Why Use Thumbnails?**
+• Make your videos more attractive
+• Professional appearance
+• Easy identification
+• Better organization
+            """
+
+_UPLOAD_PROMPT_TEXT = (
+    "📤 **Upload Thumbnail**\n\n"
+    "Please send a photo to use as thumbnail.\n\n"
+    "📋 **Requirements:**\n"
+    "• JPG or PNG format (saved as JPG)\n"
+    "• High quality recommended\n"
+    "• Will be resized to 320x180\n\n"
+    "💡 **Tips:**\n"
+    "• Use clear, attractive images\n"
+    "• Avoid copyrighted content\n"
+    "• Landscape orientation works best"
+)
+
+_SUBSCRIPTION_CHECK_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔄 Check Subscription", callback_data="sub_check")]
+])
+_THUMBNAIL_MENU_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📤 Upload Thumbnail", callback_data="thumb_upload")],
+    [InlineKeyboardButton("🖼️ My Thumbnails", callback_data="thumb_list")],
+    [InlineKeyboardButton("🗑️ Manage Thumbnails", callback_data="thumb_manage")],
+    [InlineKeyboardButton("⚙️ Settings", callback_data="settings_main")],
+    [InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")]
+])
+_EMPTY_THUMBNAILS_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📤 Upload Thumbnail", callback_data="thumb_upload")],
+    [InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")]
+])
+_NO_THUMBNAILS_KB = InlineKeyboardMarkup([[
+    InlineKeyboardButton("📤 Upload Thumbnail", callback_data="thumb_upload"),
+    InlineKeyboardButton("⬅️ Back", callback_data="thumb_menu")
+]])
+_UPLOAD_CANCEL_KB = InlineKeyboardMarkup([[
+    InlineKeyboardButton("❌ Cancel", callback_data="thumb_menu")
+]])
+_BACK_TO_MANAGEMENT_KB = InlineKeyboardMarkup([[
+    InlineKeyboardButton("⬅️ Back to Management", callback_data="thumb_manage")
+]])
+
 async def thumbnail_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /thumbnail command"""
     user_id = update.effective_user.id
@@ -25,14 +145,10 @@ async def thumbnail_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Check force subscription
         if not await check_force_subscription(user_id, context):
-            keyboard = [[InlineKeyboardButton("🔄 Check Subscription", callback_data="sub_check")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
             await update.message.reply_text(
-                "🚫 **Access Restricted**\n\n"
-                "Please join our required channels to use thumbnail features.",
+                _ACCESS_RESTRICTED_TEXT,
                 parse_mode="Markdown",
-                reply_markup=reply_markup
+                reply_markup=_SUBSCRIPTION_CHECK_KB
             )
             return
         
@@ -52,47 +168,22 @@ async def show_thumbnail_menu(update: Update, context: ContextTypes.DEFAULT_TYPE
         # Get user's thumbnails
         thumbnails = await db.get_user_thumbnails(user_id)
         
-        thumbnail_text = f"""
-🖼️ **Thumbnail Management**
-
-Upload custom thumbnails to use with your video files!
-
-📊 **Your Thumbnails:** {len(thumbnails)}
-📝 **Status:** {'Premium Feature' if len(thumbnails) > 5 else 'Free Usage'}
-
-🎯 **How to Use:**
-1. Send a photo to upload as thumbnail
-2. Give it a name for easy identification
-3. Select it when processing video files
-4. Delete unused thumbnails to save space
-
-💡 **Tips:**
-• Use high-quality images (1280x720 recommended)
-• JPG/PNG formats supported
-• Keep thumbnails relevant to your content
-• Premium users get unlimited thumbnails
-        """
-        
-        keyboard = [
-            [InlineKeyboardButton("📤 Upload Thumbnail", callback_data="thumb_upload")],
-            [InlineKeyboardButton("🖼️ My Thumbnails", callback_data="thumb_list")],
-            [InlineKeyboardButton("🗑️ Manage Thumbnails", callback_data="thumb_manage")],
-            [InlineKeyboardButton("⚙️ Settings", callback_data="settings_main")],
-            [InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        thumbnail_text = _THUMBNAIL_MENU_TEXT.format(
+            count=len(thumbnails),
+            status='Premium Feature' if len(thumbnails) > 5 else 'Free Usage'
+        )
         
         if update.callback_query:
             await update.callback_query.edit_message_text(
                 thumbnail_text,
                 parse_mode="Markdown",
-                reply_markup=reply_markup
+                reply_markup=_THUMBNAIL_MENU_KB
             )
         else:
             await update.message.reply_text(
                 thumbnail_text,
                 parse_mode="Markdown",
-                reply_markup=reply_markup
+                reply_markup=_THUMBNAIL_MENU_KB
             )
             
     except Exception as e:
@@ -120,36 +211,18 @@ async def show_thumbnails_list(update: Update, context: ContextTypes.DEFAULT_TYP
         thumbnails = await db.get_user_thumbnails(user_id)
         
         if not thumbnails:
-            thumbnail_text = """
-🖼️ **Your Thumbnails**
-
-You don't have any thumbnails yet.
-
-📤 **Upload Your First Thumbnail:**
-1. Click "Upload Thumbnail" below
-2. Send a photo
-3. Give it a name
-4. Start using it with your videos!
-
-💡 **Why Use Thumbnails?**
-• Make your videos more attractive
-• Professional appearance
-• Easy identification
-• Better organization
-            """
-            
-            keyboard = [
-                [InlineKeyboardButton("📤 Upload Thumbnail", callback_data="thumb_upload")],
-                [InlineKeyboardButton("🏠 Main Menu", callback_data="start_main")]
-            ]
+            thumbnail_text = _EMPTY_THUMBNAILS_TEXT
+            reply_markup = _EMPTY_THUMBNAILS_KB
         else:
-            thumbnail_text = f"🖼️ **Your Thumbnails ({len(thumbnails)})**\n\n"
+            parts = [f"🖼️ **Your Thumbnails ({len(thumbnails)})**\n\n"]
             
             keyboard = []
             for i, thumb in enumerate(thumbnails[:10], 1):  # Show first 10
-                thumbnail_text += f"{i}. **{thumb.name}**\n"
-                thumbnail_text += f"   ID: `{thumb.thumbnail_id[:8]}...`\n"
-                thumbnail_text += f"   Created: {thumb.created_at.strftime('%Y-%m-%d')}\n\n"
+                parts.append(
+                    f"{i}. **{thumb.name}**\n"
+                    f"   ID: `{thumb.thumbnail_id[:8]}...`\n"
+                    f"   Created: {thumb.created_at_str}\n\n"
+                )
                 
                 keyboard.append([InlineKeyboardButton(
                     f"🖼️ {thumb.name}", 
@@ -157,15 +230,16 @@ You don't have any thumbnails yet.
                 )])
             
             if len(thumbnails) > 10:
-                thumbnail_text += f"... and {len(thumbnails) - 10} more\n\n"
+                parts.append(f"... and {len(thumbnails) - 10} more\n\n")
+            
+            thumbnail_text = "".join(parts)
             
             keyboard.extend([
                 [InlineKeyboardButton("📤 Upload New", callback_data="thumb_upload")],
                 [InlineKeyboardButton("🗑️ Manage", callback_data="thumb_manage")],
                 [InlineKeyboardButton("⬅️ Back", callback_data="thumb_menu")]
             ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = InlineKeyboardMarkup(keyboard)
         
         if update.callback_query:
             await update.callback_query.edit_message_text(
@@ -199,14 +273,15 @@ async def handle_thumbnail_upload(update: Update, context: ContextTypes.DEFAULT_
             file_obj = await context.bot.get_file(photo.file_id)
             
             # Generate thumbnail ID
-            thumbnail_id = str(uuid.uuid4())
+            thumbnail_id = uuid.uuid4().hex
             
-            # Download and process image
-            temp_path = os.path.join(Config.THUMBNAIL_PATH, f"temp_{thumbnail_id}.jpg")
-            await file_obj.download_to_drive(temp_path)
+            # Download into memory; only the processed thumbnail is written to disk
+            image_data = BytesIO()
+            await file_obj.download_to_memory(image_data)
+            image_data.seek(0)
             
             # Process image
-            processed_path = await process_thumbnail_image(temp_path, thumbnail_id)
+            processed_path = await process_thumbnail_image(image_data, thumbnail_id)
             
             # Store in context for naming
             context.user_data['pending_thumbnail'] = {
@@ -215,10 +290,6 @@ async def handle_thumbnail_upload(update: Update, context: ContextTypes.DEFAULT_
                 'processed_path': processed_path
             }
             
-            # Clean up temp file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            
             # Ask for name
             await update.message.reply_text(
                 "📝 **Name Your Thumbnail**\n\n"
@@ -242,21 +313,89 @@ async def handle_thumbnail_upload(update: Update, context: ContextTypes.DEFAULT_
             "❌ An error occurred while processing your thumbnail. Please try again."
         )
 
-async def process_thumbnail_image(input_path: str, thumbnail_id: str) -> str:
+async def process_thumbnail_image(image_data: BytesIO, thumbnail_id: str) -> str:
     """Process uploaded thumbnail image"""
+    return await asyncio.get_running_loop().run_in_executor(
+        _THUMB_POOL, _process_thumbnail_sync, image_data, thumbnail_id
+    )
+
+def _remove_files(paths: Iterable[str]):
+    """Remove files, ignoring any that are already gone"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+async def _unlink_if_exists(*paths: str):
+    """Remove files in a single worker thread hop without blocking the event loop"""
+    await asyncio.to_thread(_remove_files, paths)
+
+def _jpegtran_thumbnail(image_data: BytesIO, output_path: str) -> bool:
+    """Downscale a JPEG in the DCT domain with jpegtran; False if not applicable"""
+    data = image_data.getvalue()
+    if not data.startswith(_JPEG_MAGIC):
+        return False
+    
+    try:
+        img = jpegtran.JPEGImage(blob=data)
+        # Leave oversize images to the PIL path, which rejects them
+        if img.width * img.height > _MAX_THUMBNAIL_PIXELS:
+            return False
+        
+        scale = min(_THUMBNAIL_SIZE[0] / img.width, _THUMBNAIL_SIZE[1] / img.height)
+        if scale >= 1:
+            return False
+        
+        width = max(1, round(img.width * scale))
+        height = max(1, round(img.height * scale))
+        img.downscale(width, height, quality=_JPEG_QUALITY).save(output_path)
+        return True
+        
+    except Exception as e:
+        logger.warning("jpegtran thumbnail failed, falling back to PIL: %s", e)
+        return False
+
+def _process_thumbnail_sync(image_data: BytesIO, thumbnail_id: str) -> str:
+    """Resize and save a thumbnail image (runs in the thumbnail thread pool)"""
+    # Only JPEG and PNG are accepted; reject anything else before decoding
+    if not bytes(image_data.getbuffer()[:8]).startswith((_JPEG_MAGIC, _PNG_MAGIC)):
+        raise ValueError("Unsupported thumbnail image format")
+    
+    output_path = _thumbnail_path(thumbnail_id)
+    
+    if jpegtran is not None and _jpegtran_thumbnail(image_data, output_path):
+        return output_path
+    
     try:
         # Open and process image
-        with Image.open(input_path) as img:
+        with Image.open(image_data, formats=('JPEG', 'PNG')) as img:
+            # Only the header has been read so far; refuse oversize images before decoding
+            if img.width * img.height > _MAX_THUMBNAIL_PIXELS:
+                raise ValueError(f"Thumbnail image too large: {img.width}x{img.height}")
+            
+            # Animated images (APNG) are thumbnailed from their first frame
+            if getattr(img, 'is_animated', False):
+                img.seek(0)
+            
+            # Let libjpeg scale JPEGs down while decoding (no-op for other formats)
+            img.draft('RGB', (640, 360))
+            
             # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
+            if img.mode not in ('RGB', 'L'):
                 img = img.convert('RGB')
             
+            # Cheap box-filter prescale for very large images so LANCZOS only
+            # has to run on a ~640px input; reduce() rounds each side up, so
+            # extreme aspect ratios never shrink a side to 0
+            if max(img.size) > 1280:
+                img = img.reduce(max(img.size) // 640)
+            
             # Resize to standard thumbnail size
-            img.thumbnail((320, 180), Image.Resampling.LANCZOS)
+            img.thumbnail(_THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
             
             # Save processed image
-            output_path = os.path.join(Config.THUMBNAIL_PATH, f"{thumbnail_id}.jpg")
-            img.save(output_path, 'JPEG', quality=85, optimize=True)
+            img.save(output_path, 'JPEG', quality=_JPEG_QUALITY, optimize=True, progressive=True, subsampling=2)
             
             return output_path
             
@@ -295,8 +434,11 @@ async def handle_thumbnail_name(update: Update, context: ContextTypes.DEFAULT_TY
             name=thumbnail_name
         )
         
-        # Save to database
-        success = await db.create_thumbnail(thumbnail)
+        # Save to database, fetching settings alongside for the default check
+        success, settings = await asyncio.gather(
+            db.create_thumbnail(thumbnail),
+            db.get_user_settings(user_id)
+        )
         
         if success:
             await update.message.reply_text(
@@ -307,7 +449,6 @@ async def handle_thumbnail_name(update: Update, context: ContextTypes.DEFAULT_TY
             )
             
             # Update user settings if this is their first thumbnail
-            settings = await db.get_user_settings(user_id)
             if settings and not settings.default_thumbnail:
                 await db.update_user_settings(user_id, {
                     "default_thumbnail": f"{thumbnail.thumbnail_id}.jpg"
@@ -333,32 +474,18 @@ async def thumbnail_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await query.answer()
     
     user_id = update.effective_user.id
-    action = query.data.replace("thumb_", "")
+    action = query.data.partition("_")[2]
     
     try:
-        if action == "menu":
-            await show_thumbnail_menu(update, context)
-        
-        elif action == "upload":
-            await start_thumbnail_upload(update, context)
-        
-        elif action == "list":
-            await show_thumbnails_list(update, context, user_id)
-        
-        elif action == "manage":
-            await show_thumbnail_management(update, context, user_id)
-        
-        elif action.startswith("view_"):
-            thumbnail_id = action.replace("view_", "")
-            await show_thumbnail_details(update, context, thumbnail_id, user_id)
-        
-        elif action.startswith("delete_"):
-            thumbnail_id = action.replace("delete_", "")
-            await delete_thumbnail(update, context, thumbnail_id, user_id)
+        handler = _CALLBACK_ACTIONS.get(action)
+        if handler:
+            await handler(update, context, user_id)
+            return
         
-        elif action.startswith("set_default_"):
-            thumbnail_id = action.replace("set_default_", "")
-            await set_default_thumbnail(update, context, thumbnail_id, user_id)
+        for prefix, handler in _PREFIX_ACTIONS:
+            if action.startswith(prefix):
+                await handler(update, context, action[len(prefix):], user_id)
+                return
             
     except Exception as e:
         logger.error(f"Error in thumbnail callback: {e}")
@@ -372,20 +499,9 @@ async def start_thumbnail_upload(update: Update, context: ContextTypes.DEFAULT_T
         context.user_data['awaiting_thumbnail_upload'] = True
         
         await update.callback_query.edit_message_text(
-            "📤 **Upload Thumbnail**\n\n"
-            "Please send a photo to use as thumbnail.\n\n"
-            "📋 **Requirements:**\n"
-            "• JPG or PNG format\n"
-            "• High quality recommended\n"
-            "• Will be resized to 320x180\n\n"
-            "💡 **Tips:**\n"
-            "• Use clear, attractive images\n"
-            "• Avoid copyrighted content\n"
-            "• Landscape orientation works best",
+            _UPLOAD_PROMPT_TEXT,
             parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("❌ Cancel", callback_data="thumb_menu")
-            ]])
+            reply_markup=_UPLOAD_CANCEL_KB
         )
         
     except Exception as e:
@@ -404,10 +520,7 @@ async def show_thumbnail_management(update: Update, context: ContextTypes.DEFAUL
                 "🖼️ **No Thumbnails Found**\n\n"
                 "You don't have any thumbnails to manage.\n"
                 "Upload some thumbnails first!",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("📤 Upload Thumbnail", callback_data="thumb_upload"),
-                    InlineKeyboardButton("⬅️ Back", callback_data="thumb_menu")
-                ]])
+                reply_markup=_NO_THUMBNAILS_KB
             )
             return
         
@@ -443,9 +556,11 @@ You have {len(thumbnails)} thumbnail(s).
 async def show_thumbnail_details(update: Update, context: ContextTypes.DEFAULT_TYPE, thumbnail_id: str, user_id: int):
     """Show thumbnail details and options"""
     try:
-        # Get thumbnail from database
-        thumbnails = await db.get_user_thumbnails(user_id)
-        thumbnail = next((t for t in thumbnails if t.thumbnail_id == thumbnail_id), None)
+        # Get thumbnail and settings (to check if it's default) from database
+        thumbnail, settings = await asyncio.gather(
+            db.get_thumbnail(thumbnail_id, user_id),
+            db.get_user_settings(user_id)
+        )
         
         if not thumbnail:
             await update.callback_query.edit_message_text(
@@ -453,8 +568,6 @@ async def show_thumbnail_details(update: Update, context: ContextTypes.DEFAULT_T
             )
             return
         
-        # Get user settings to check if it's default
-        settings = await db.get_user_settings(user_id)
         is_default = (settings and settings.default_thumbnail == f"{thumbnail_id}.jpg")
         
         details_text = f"""
@@ -462,7 +575,7 @@ async def show_thumbnail_details(update: Update, context: ContextTypes.DEFAULT_T
 
 **Name:** {thumbnail.name}
 **ID:** `{thumbnail.thumbnail_id[:12]}...`
-**Created:** {thumbnail.created_at.strftime('%Y-%m-%d %H:%M:%S')}
+**Created:** {thumbnail.created_at_full}
 **Status:** {'🌟 Default' if is_default else '📁 Available'}
 
 **Actions:**
@@ -499,26 +612,24 @@ async def show_thumbnail_details(update: Update, context: ContextTypes.DEFAULT_T
 async def delete_thumbnail(update: Update, context: ContextTypes.DEFAULT_TYPE, thumbnail_id: str, user_id: int):
     """Delete a thumbnail"""
     try:
-        # Delete from database
-        success = await db.delete_thumbnail(thumbnail_id, user_id)
+        # Delete from database, fetching settings alongside for the default check
+        success, settings = await asyncio.gather(
+            db.delete_thumbnail(thumbnail_id, user_id),
+            db.get_user_settings(user_id)
+        )
         
         if success:
-            # Delete file from filesystem
-            file_path = os.path.join(Config.THUMBNAIL_PATH, f"{thumbnail_id}.jpg")
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            
-            # Update user settings if this was the default thumbnail
-            settings = await db.get_user_settings(user_id)
+            # Delete file from filesystem, clearing the default thumbnail alongside if it was this one
+            file_path = _thumbnail_path(thumbnail_id)
+            cleanup = [_unlink_if_exists(file_path)]
             if settings and settings.default_thumbnail == f"{thumbnail_id}.jpg":
-                await db.update_user_settings(user_id, {"default_thumbnail": None})
+                cleanup.append(db.update_user_settings(user_id, {"default_thumbnail": None}))
+            await asyncio.gather(*cleanup)
             
             await update.callback_query.edit_message_text(
                 "✅ **Thumbnail Deleted Successfully**\n\n"
                 "The thumbnail has been removed from your collection.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Back to Management", callback_data="thumb_manage")
-                ]])
+                reply_markup=_BACK_TO_MANAGEMENT_KB
             )
         else:
             await update.callback_query.edit_message_text(
@@ -543,9 +654,7 @@ async def set_default_thumbnail(update: Update, context: ContextTypes.DEFAULT_TY
             await update.callback_query.edit_message_text(
                 "✅ **Default Thumbnail Updated**\n\n"
                 "This thumbnail will now be used automatically for your video files.",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("⬅️ Back to Management", callback_data="thumb_manage")
-                ]])
+                reply_markup=_BACK_TO_MANAGEMENT_KB
             )
         else:
             await update.callback_query.edit_message_text(
@@ -557,3 +666,26 @@ async def set_default_thumbnail(update: Update, context: ContextTypes.DEFAULT_TY
         await update.callback_query.edit_message_text(
             "❌ An error occurred while setting the default thumbnail."
         )
+
+async def _show_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+    """Callback adapter for show_thumbnail_menu"""
+    await show_thumbnail_menu(update, context)
+
+async def _start_upload(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+    """Callback adapter for start_thumbnail_upload"""
+    await start_thumbnail_upload(update, context)
+
+# thumbnail_callback routing: callback data minus "thumb_" -> handler(update, context, user_id)
+_CALLBACK_ACTIONS = {
+    "menu": _show_menu,
+    "upload": _start_upload,
+    "list": show_thumbnails_list,
+    "manage": show_thumbnail_management,
+}
+
+# thumbnail_callback routing for "<prefix><thumbnail_id>" actions -> handler(update, context, thumbnail_id, user_id)
+_PREFIX_ACTIONS = (
+    ("view_", show_thumbnail_details),
+    ("delete_", delete_thumbnail),
+    ("set_default_", set_default_thumbnail),
+)
@@ -10,9 +10,10 @@ import logging
 import asyncio
 import signal
 import sys
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram.ext import AIORateLimiter, Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 from telegram import Update
 from telegram.ext import ContextTypes
+from telegram.request import HTTPXRequest
 
 from config import Config
 from database.connection import init_database, close_database
@@ -27,6 +28,23 @@ from utils.logger import setup_logger
 setup_logger()
 logger = logging.getLogger(__name__)
 
+# Callback data prefix (text before the first "_") -> handler
+_CALLBACK_ROUTES = {
+    "settings": settings.settings_callback,
+    "thumb": thumbnails.thumbnail_callback,
+    "autorename": autorename.autorename_callback,
+    "sub": subscription.subscription_callback,
+    "admin": admin.admin_callback,
+    "caption": caption.caption_callback,
+    "replace": replace.replace_callback,
+    "metadata": metadata.metadata_callback,
+    "mode": mode.mode_callback,
+    "preview": preview.preview_callback,
+    "template": settemplate.template_callback,
+    "banner": banner.banner_callback,
+    "leaderboard": leaderboard.leaderboard_callback,
+}
+
 class TelegramBot:
     def __init__(self):
         self.config = Config()
@@ -35,7 +53,25 @@ class TelegramBot:
     async def setup_application(self):
         """Initialize the Telegram bot application"""
         try:
-            self.application = Application.builder().token(self.config.BOT_TOKEN).build()
+            self.application = (
+                Application.builder()
+                .token(self.config.BOT_TOKEN)
+                # Keep enough warm connections for concurrent API calls and file downloads
+                .request(HTTPXRequest(
+                    connection_pool_size=32,
+                    read_timeout=60,
+                    write_timeout=60
+                ))
+                # Throttle outgoing requests below Telegram's flood limits instead of hitting RetryAfter
+                .rate_limiter(AIORateLimiter(
+                    overall_max_rate=28,
+                    overall_time_period=1,
+                    group_max_rate=18,
+                    group_time_period=60
+                ))
+                .post_shutdown(self.post_shutdown)
+                .build()
+            )
             
             # Initialize database
             await init_database()
@@ -84,20 +120,8 @@ class TelegramBot:
         app.add_handler(CommandHandler("addpremium", admin.add_premium_command))
         app.add_handler(CommandHandler("removepremium", admin.remove_premium_command))
 
-        # Callback query handlers
-        app.add_handler(CallbackQueryHandler(settings.settings_callback, pattern="^settings_"))
-        app.add_handler(CallbackQueryHandler(thumbnails.thumbnail_callback, pattern="^thumb_"))
-        app.add_handler(CallbackQueryHandler(autorename.autorename_callback, pattern="^autorename_"))
-        app.add_handler(CallbackQueryHandler(subscription.subscription_callback, pattern="^sub_"))
-        app.add_handler(CallbackQueryHandler(admin.admin_callback, pattern="^admin_"))
-        app.add_handler(CallbackQueryHandler(caption.caption_callback, pattern="^caption_"))
-        app.add_handler(CallbackQueryHandler(replace.replace_callback, pattern="^replace_"))
-        app.add_handler(CallbackQueryHandler(metadata.metadata_callback, pattern="^metadata_"))
-        app.add_handler(CallbackQueryHandler(mode.mode_callback, pattern="^mode_"))
-        app.add_handler(CallbackQueryHandler(preview.preview_callback, pattern="^preview_"))
-        app.add_handler(CallbackQueryHandler(settemplate.template_callback, pattern="^template_"))
-        app.add_handler(CallbackQueryHandler(banner.banner_callback, pattern="^banner_"))
-        app.add_handler(CallbackQueryHandler(leaderboard.leaderboard_callback, pattern="^leaderboard_"))
+        # Callback query handler, routed by callback data prefix
+        app.add_handler(CallbackQueryHandler(self.dispatch_callback))
 
         # File handlers
         app.add_handler(MessageHandler(filters.Document.ALL, files.handle_document))
@@ -113,6 +137,25 @@ class TelegramBot:
 
         logger.info("All handlers registered successfully")
 
+    async def dispatch_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Route a callback query to its handler by the prefix of its data"""
+        data = update.callback_query.data
+        if not data:
+            return
+        
+        handler = _CALLBACK_ROUTES.get(data.partition("_")[0])
+        if handler:
+            await handler(update, context)
+
+    async def post_shutdown(self, application: Application):
+        """Flush buffered writes and close the database on shutdown"""
+        try:
+            await replace.flush_pending_writes()
+        except Exception as e:
+            logger.error(f"Failed to flush pending writes: {e}")
+
+        await close_database()
+
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors that occur during bot operation"""
         logger.error(f"Update {update} caused error {context.error}")
@@ -3,15 +3,18 @@ Authentication middleware for the Telegram bot
 """
 
 import logging
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+import re
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List
 from functools import wraps
 
-from telegram import Update
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
 from config import Config
-from database.connection import db
+from database.connection import db, USER_ACCESS_CACHE_TTL
+from database.models import User
 from utils.helpers import is_admin
 from utils.logger import SecurityLogger
 
@@ -23,18 +26,20 @@ class AuthMiddleware:
     
     def __init__(self):
         self.banned_users = set()
-        self.rate_limits = {}
+        # "<user_id>_<action>" -> [window_start, previous_window_count, current_window_count]
+        self.rate_limits: Dict[str, List[float]] = {}
         self.session_cache = {}
         
-    async def check_user_banned(self, user_id: int) -> bool:
-        """Check if user is banned"""
+    async def check_user_banned(self, user_id: int, user: Optional[User] = None) -> bool:
+        """Check if user is banned, reusing an already-loaded user record if given"""
         try:
             # Check cache first
             if user_id in self.banned_users:
                 return True
             
             # Check database
-            user = await db.get_user(user_id)
+            if user is None:
+                user = await db.get_user(user_id, max_age=USER_ACCESS_CACHE_TTL)
             if user and user.is_banned:
                 self.banned_users.add(user_id)
                 return True
@@ -45,40 +50,50 @@ class AuthMiddleware:
             logger.error(f"Error checking banned user: {e}")
             return False
     
-    async def check_rate_limit(self, user_id: int, action: str = "general") -> bool:
-        """Check if user has exceeded rate limit"""
+    async def check_rate_limit(self, user_id: int, action: str = "general",
+                               limit: Optional[int] = None, window: Optional[int] = None) -> bool:
+        """Check if user has exceeded rate limit (defaults to the configured limit and window)"""
         try:
-            current_time = datetime.now()
+            limit = limit or Config.RATE_LIMIT_MESSAGES
+            window = window or Config.RATE_LIMIT_WINDOW
+            current_time = time.monotonic()
             user_key = f"{user_id}_{action}"
             
-            # Clean old entries
-            if user_key in self.rate_limits:
-                self.rate_limits[user_key] = [
-                    timestamp for timestamp in self.rate_limits[user_key]
-                    if current_time - timestamp < timedelta(seconds=Config.RATE_LIMIT_WINDOW)
-                ]
-            
-            # Check current rate
-            if user_key not in self.rate_limits:
-                self.rate_limits[user_key] = []
-            
-            if len(self.rate_limits[user_key]) >= Config.RATE_LIMIT_MESSAGES:
+            state = self.rate_limits.get(user_key)
+            if state is None:
+                state = self.rate_limits[user_key] = [current_time, 0, 0]
+            
+            # Roll to a new fixed window; the previous count only carries over if adjacent
+            elapsed = current_time - state[0]
+            if elapsed >= window:
+                if elapsed < 2 * window:
+                    state[0] += window
+                    state[1] = state[2]
+                else:
+                    state[0] = current_time
+                    state[1] = 0
+                state[2] = 0
+            
+            # Sliding-window estimate: previous window weighted by how much of it still overlaps
+            overlap = 1 - (current_time - state[0]) / window
+            if state[1] * overlap + state[2] >= limit:
                 security_logger.log_rate_limit_exceeded(user_id, action)
                 return False
             
             # Add current request
-            self.rate_limits[user_key].append(current_time)
+            state[2] += 1
             return True
             
         except Exception as e:
             logger.error(f"Error checking rate limit: {e}")
             return True  # Allow on error
     
-    async def validate_user_session(self, user_id: int) -> bool:
-        """Validate user session"""
+    async def validate_user_session(self, user_id: int, user: Optional[User] = None) -> bool:
+        """Validate user session, reusing an already-loaded user record if given"""
         try:
             # Check if user exists and is valid
-            user = await db.get_user(user_id)
+            if user is None:
+                user = await db.get_user(user_id, max_age=USER_ACCESS_CACHE_TTL)
             if not user:
                 return False
             
@@ -112,14 +127,29 @@ class AuthMiddleware:
 # Global middleware instance
 auth_middleware = AuthMiddleware()
 
+async def get_request_user(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[User]:
+    """Get the user record for the current update, fetching it at most once
+    
+    The record is cached in user_data together with the update ID, so the
+    decorators and the handler they wrap share one database lookup.
+    """
+    cached = context.user_data.get('_request_user')
+    if cached and cached[0] == update.update_id:
+        return cached[1]
+    
+    user = await db.get_user(update.effective_user.id, max_age=USER_ACCESS_CACHE_TTL)
+    context.user_data['_request_user'] = (update.update_id, user)
+    return user
+
 def require_auth(func):
     """Decorator to require authentication"""
     @wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
         user_id = update.effective_user.id
+        user = await get_request_user(update, context)
         
         # Check if user is banned
-        if await auth_middleware.check_user_banned(user_id):
+        if await auth_middleware.check_user_banned(user_id, user):
             await update.message.reply_text(
                 "🚫 **Access Denied**\n\n"
                 "Your account has been suspended. Contact support if you believe this is an error."
@@ -136,7 +166,7 @@ def require_auth(func):
             return
         
         # Validate session
-        if not await auth_middleware.validate_user_session(user_id):
+        if not await auth_middleware.validate_user_session(user_id, user):
             await update.message.reply_text(
                 "❌ **Authentication Required**\n\n"
                 "Please start the bot with /start to authenticate."
@@ -175,10 +205,8 @@ def require_premium(func):
     """Decorator to require premium subscription"""
     @wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
-        user_id = update.effective_user.id
-        
         # Check premium status
-        user = await db.get_user(user_id)
+        user = await get_request_user(update, context)
         if not user or not user.is_premium_active():
             await update.message.reply_text(
                 "💎 **Premium Required**\n\n"
@@ -204,29 +232,12 @@ def rate_limit(action: str = "general", limit: int = None, window: int = None):
             
             # Use custom limits if provided
             if limit and window:
-                current_time = datetime.now()
-                user_key = f"{user_id}_{action}"
-                
-                # Check custom rate limit
-                if user_key not in auth_middleware.rate_limits:
-                    auth_middleware.rate_limits[user_key] = []
-                
-                # Clean old entries
-                auth_middleware.rate_limits[user_key] = [
-                    timestamp for timestamp in auth_middleware.rate_limits[user_key]
-                    if current_time - timestamp < timedelta(seconds=window)
-                ]
-                
-                # Check limit
-                if len(auth_middleware.rate_limits[user_key]) >= limit:
+                if not await auth_middleware.check_rate_limit(user_id, action, limit, window):
                     await update.message.reply_text(
                         f"⏰ **Rate Limit Exceeded**\n\n"
                         f"You can only use this feature {limit} times per {window} seconds."
                     )
                     return
-                
-                # Add current request
-                auth_middleware.rate_limits[user_key].append(current_time)
             else:
                 # Use default rate limit
                 if not await auth_middleware.check_rate_limit(user_id, action):
@@ -334,8 +345,6 @@ class SecurityValidator:
     @staticmethod
     def sanitize_filename(filename: str) -> str:
         """Sanitize filename for safe storage"""
-        import re
-        
         # Remove path traversal attempts
         filename = filename.replace('..', '')
         filename = filename.replace('/', '_')
@@ -2,6 +2,7 @@
 Subscription check middleware for force subscription feature
 """
 
+import asyncio
 import logging
 from typing import List, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -18,6 +19,9 @@ async def check_force_subscription(user_id: int, context: ContextTypes.DEFAULT_T
     """
     Check if user has subscribed to all required channels
     
+    Results are cached per user by subscription_manager; clear the user's entry
+    to force a fresh check (e.g. when they press "Check Subscription").
+    
     Args:
         user_id: Telegram user ID
         context: Bot context
@@ -25,29 +29,37 @@ async def check_force_subscription(user_id: int, context: ContextTypes.DEFAULT_T
     Returns:
         True if user has subscribed to all channels or no channels required
     """
-    try:
-        # Skip check for admins
-        if is_admin(user_id):
-            return True
-        
-        # Get force subscription channels
-        channels = await db.get_force_sub_channels()
-        
-        # If no channels configured, allow access
-        if not channels:
-            return True
-        
-        # Check subscription status for each channel
-        for channel in channels:
-            if not await check_channel_subscription(user_id, channel, context):
-                return False
-        
-        return True
+    return await subscription_manager.is_subscribed(user_id, context)
+
+async def _check_all_channels(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> Optional[bool]:
+    """
+    Check channel membership against Telegram, bypassing the cache
+    
+    Unexpected errors are raised so the caller can fail open without caching.
+    
+    Args:
+        user_id: Telegram user ID
+        context: Bot context
         
-    except Exception as e:
-        logger.error(f"Error checking force subscription: {e}")
-        # On error, allow access to prevent blocking legitimate users
+    Returns:
+        True if user has subscribed to all channels, False if not, or None if
+        there were no channels to check (none configured, or the channel list
+        could not be loaded)
+    """
+    # Skip check for admins
+    if is_admin(user_id):
         return True
+    
+    # Get force subscription channels; the database returns an empty list on errors
+    channels = await db.get_force_sub_channels()
+    if not channels:
+        return None
+    
+    # Check subscription status for all channels concurrently
+    results = await asyncio.gather(
+        *(check_channel_subscription(user_id, channel, context) for channel in channels)
+    )
+    return all(results)
 
 async def check_channel_subscription(user_id: int, channel: ForceSubChannel, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """
@@ -119,7 +131,7 @@ async def get_subscription_message(user_id: int, context: ContextTypes.DEFAULT_T
             # Create join button
             if channel.channel_username:
                 # Public channel with username
-                join_url = f"https://t.me/{channel.channel_username.replace('@', '')}"
+                join_url = channel.join_url
                 button_text = f"📺 Join {channel.channel_name}"
             else:
                 # Private channel with invite link
@@ -131,7 +143,7 @@ async def get_subscription_message(user_id: int, context: ContextTypes.DEFAULT_T
                 except Exception as e:
                     logger.error(f"Error getting invite link for {channel.channel_id}: {e}")
                     # Fallback to channel ID (will open in Telegram)
-                    join_url = f"https://t.me/c/{channel.channel_id.replace('-100', '')}"
+                    join_url = channel.join_url
                     button_text = f"📺 Join {channel.channel_name}"
             
             keyboard.append([InlineKeyboardButton(button_text, url=join_url)])
@@ -164,6 +176,9 @@ async def handle_subscription_check(update: Update, context: ContextTypes.DEFAUL
         
         user_id = update.effective_user.id
         
+        # The user may have just joined, so don't trust a cached result
+        subscription_manager.clear_cache(user_id)
+        
         # Check subscription status
         if await check_force_subscription(user_id, context):
             await query.edit_message_text(
@@ -243,13 +258,11 @@ async def get_unsubscribed_channels(user_id: int, context: ContextTypes.DEFAULT_
     """
     try:
         channels = await db.get_force_sub_channels()
-        unsubscribed = []
-        
-        for channel in channels:
-            if not await check_channel_subscription(user_id, channel, context):
-                unsubscribed.append(channel)
+        results = await asyncio.gather(
+            *(check_channel_subscription(user_id, channel, context) for channel in channels)
+        )
         
-        return unsubscribed
+        return [channel for channel, subscribed in zip(channels, results) if not subscribed]
         
     except Exception as e:
         logger.error(f"Error getting unsubscribed channels: {e}")
@@ -284,6 +297,7 @@ class SubscriptionManager:
     def __init__(self):
         self.subscription_cache = {}
         self.cache_expiry = 300  # 5 minutes
+        self.cache_max_size = 50000
     
     async def is_subscribed(self, user_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
         """
@@ -307,9 +321,17 @@ class SubscriptionManager:
                     return cached_data['subscribed']
             
             # Check actual subscription
-            subscribed = await check_force_subscription(user_id, context)
+            subscribed = await _check_all_channels(user_id, context)
             
-            # Update cache
+            # Nothing was verified; allow access but don't remember it, so a
+            # transient database failure doesn't let the user through for the full TTL
+            if subscribed is None:
+                return True
+            
+            # Update cache, re-inserting so the oldest entry is evicted first when full
+            self.subscription_cache.pop(user_id, None)
+            if len(self.subscription_cache) >= self.cache_max_size:
+                self.subscription_cache.pop(next(iter(self.subscription_cache)))
             self.subscription_cache[user_id] = {
                 'subscribed': subscribed,
                 'timestamp': current_time
@@ -319,7 +341,8 @@ class SubscriptionManager:
             
         except Exception as e:
             logger.error(f"Error checking subscription with cache: {e}")
-            return False
+            # On error, allow access to prevent blocking legitimate users
+            return True
     
     def clear_cache(self, user_id: int = None):
         """
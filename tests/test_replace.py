@@ -0,0 +1,31 @@
+"""
+Tests for text replacement rules
+"""
+
+import pytest
+
+pytest.importorskip("telegram")
+pytest.importorskip("motor")
+
+from handlers.replace import apply_replace_rules
+
+
+def _rule(old, new, case_sensitive=False):
+    return {'old': old, 'new': new, 'enabled': True, 'case_sensitive': case_sensitive}
+
+
+def test_case_insensitive_match_that_does_not_lowercase_to_rule_key():
+    # 'İ'.lower() is 'i̇' (two code points), but it still matches the rule 'i'
+    rules = [_rule('i', 'I'), _rule('.', ' ')]
+    assert apply_replace_rules('İstanbul.x', rules) == 'Istanbul x'
+
+
+def test_kelvin_sign_matches_case_insensitive_rule():
+    # U+212A KELVIN SIGN matches 'k' case-insensitively
+    rules = [_rule('k', 'K'), _rule('_', ' ')]
+    assert apply_replace_rules('\u212a_file', rules) == 'K file'
+
+
+def test_longest_rule_wins_case_insensitive():
+    rules = [_rule('ab', 'Y'), _rule('abc', 'Z'), _rule('x', '')]
+    assert apply_replace_rules('ABC-ab-x', rules) == 'Z-Y-'
@@ -5,6 +5,7 @@ Helper utilities for the Telegram bot
 import os
 import re
 import logging
+import base64
 import hashlib
 import random
 import string
@@ -26,6 +27,18 @@ def generate_referral_code(length: int = 8) -> str:
         logger.error(f"Error generating referral code: {e}")
         return "DEFAULT"
 
+def derive_referral_code(user_id: int) -> str:
+    """Derive a user's referral code from their ID, keyed with Config.REFERRAL_SECRET
+    
+    Codes are deterministic, so no uniqueness check is needed when registering.
+    """
+    digest = hashlib.blake2b(
+        str(user_id).encode(),
+        key=Config.REFERRAL_SECRET.encode()[:64],
+        digest_size=6
+    ).digest()
+    return base64.urlsafe_b64encode(digest).decode()
+
 def get_user_info(telegram_user: TelegramUser) -> Dict[str, Any]:
     """Extract user information from Telegram user object"""
     try:
@@ -195,7 +208,6 @@ def format_progress(current: int, total: int, width: int = 20) -> str:
 def validate_url(url: str) -> bool:
     """Validate URL format"""
     try:
-        import re
         url_pattern = re.compile(
             r'^https?://'  # http:// or https://
             r'(?:(?:[A-Z0-9](?:[A-Z0-9-]{0,61}[A-Z0-9])?\.)+[A-Z]{2,6}\.?|'  # domain...
@@ -238,8 +250,6 @@ def parse_time_string(time_str: str) -> Optional[timedelta]:
     """Parse time string to timedelta"""
     try:
         # Parse formats like "1d", "2h", "30m", "45s"
-        import re
-        
         time_units = {
             's': 1, 'sec': 1, 'second': 1, 'seconds': 1,
             'm': 60, 'min': 60, 'minute': 60, 'minutes': 60,
@@ -265,8 +275,6 @@ def parse_time_string(time_str: str) -> Optional[timedelta]:
 def is_valid_telegram_username(username: str) -> bool:
     """Validate Telegram username format"""
     try:
-        import re
-        
         # Remove @ if present
         username = username.lstrip('@')
         
@@ -316,7 +324,6 @@ def get_mime_type(filename: str) -> str:
 def clean_html(text: str) -> str:
     """Clean HTML tags from text"""
     try:
-        import re
         clean = re.compile('<.*?>')
         return re.sub(clean, '', text)
         
@@ -457,7 +464,6 @@ def extract_file_info(filename: str) -> Dict[str, Any]:
         clean_name = filename.replace(extension, '') if extension else filename
         
         # Extract year if present
-        import re
         year_match = re.search(r'\b(19|20)\d{2}\b', clean_name)
         if year_match:
             info['year'] = year_match.group()
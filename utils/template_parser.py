@@ -92,8 +92,8 @@ class TemplateParser:
             # Find all template variables
             template_vars = re.findall(r'\{([^}]+)\}', self.template)
             
-            # Extract values from filename
-            extracted_values = self._extract_all_values(name_without_ext)
+            # Extract values from filename; literal templates have nothing to fill in
+            extracted_values = self._extract_all_values(name_without_ext) if template_vars else {}
             
             # Replace variables in template
             for var in template_vars: